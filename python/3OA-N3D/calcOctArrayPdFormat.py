@@ -1,6 +1,12 @@
 #!/usr/bin/env python3
 import numpy as np
 import argparse
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime, timezone
 
 """
 3rd-Order Ambisonics Octagonal Decoder Generator
@@ -19,12 +25,29 @@ USAGE:
     python ambi_decoder.py --norm N3D
         -> Generates only 3OA_Oct_N3D.txt
 
+    python ambi_decoder.py --dual-band --xover 400 --sr 48000
+        -> Also generates 3OA_Oct_<norm>_LF.txt (basic), 3OA_Oct_<norm>_HF.txt
+           (max-rE) and 3OA_Oct_Xover.txt (crossover coefficients)
+
 FLAGS:
     --norm {SN3D, N3D}
         Selects normalization scheme:
             SN3D - Schmidt semi-normalized (default in AmbiX/Google VR, HOA in DAWs)
             N3D  - Orthonormalized (used in some HOA libraries and research contexts)
         If omitted, both normalizations are generated.
+    --dual-band
+        Also write matching LF (basic) and HF (max-rE) matrices plus a
+        Linkwitz-Riley crossover for shelf decoding (see python/tools/ambiDecode.py).
+    --xover HZ, --sr HZ
+        Crossover frequency (default 400) and sample rate (default 48000).
+    --profile FILE
+        Append one JSON line per norm (and weighting) with wall time and
+        allocations of each build stage (sh_eval, normalize, pinv, round),
+        plus condition number, singular values and rank of K and the error
+        introduced by rounding to 7 decimals, and a UTC timestamp. Stage times
+        come from the build that writes the file, with tracing off; the
+        allocations from a second, traced build. '-' writes the JSON lines to
+        stdout and the 'Wrote' messages to stderr.
 """
 
 # Format: [azimuth, elevation] (radians)
@@ -80,35 +103,138 @@ def apply_normalization(sh_vec, norm):
     out[9:16] /= np.sqrt(7.0)  # l=3
     return out
 
-def build_decoder(norm='SN3D'):
-    rows = []
-    for azi, ele in speakers:
-        sh_n3d = sh16_n3d(azi, ele)
-        sh = apply_normalization(sh_n3d, norm)
-        rows.append(sh)
-    K = np.asarray(rows, dtype=np.float64)
-    return np.linalg.pinv(K).T.round(7)
-
-def write_decoder(norm):
-    M = build_decoder(norm)
-    outname = f"3OA_Oct_{norm}.txt"
+# --- Dual-band (shelf) decoding ---
+# The HF matrix is the basic matrix with per-order max-rE weights
+# g_l = P_l(cos(137.9 deg / (N + 1.51))), rescaled to the energy of the LF band.
+ACN_DEGREE = np.array([0, 1, 1, 1, 2, 2, 2, 2, 2, 3, 3, 3, 3, 3, 3, 3])
+
+def maxre_gains():
+    x = np.cos(np.radians(137.9) / (3 + 1.51))
+    g_l = np.array([1.0, x, 0.5 * (3.0 * x**2 - 1.0), 0.5 * (5.0 * x**3 - 3.0 * x)])
+    g = g_l[ACN_DEGREE]
+    return g * np.sqrt(len(g) / np.sum(g ** 2))
+
+def build_crossover(freq=400.0, sr=48000.0):
+    """
+    4th-order Linkwitz-Riley crossover: each band is one Butterworth biquad
+    run twice. Both bands share the denominator, so they stay phase-matched
+    and LF + HF sums to an allpass.
+    Layout: sr, freq, LP (fb1 fb2 ff1 ff2 ff3), HP (fb1 fb2 ff1 ff2 ff3),
+    biquads in Pd biquad~ argument order.
+    """
+    w0 = 2.0 * np.pi * freq / sr
+    cosw = np.cos(w0)
+    alpha = np.sin(w0) / np.sqrt(2.0)  # Q = 1/sqrt(2)
+    a0 = 1.0 + alpha
+    fb = [2.0 * cosw / a0, -(1.0 - alpha) / a0]
+    lp = [(1.0 - cosw) / (2.0 * a0), (1.0 - cosw) / a0, (1.0 - cosw) / (2.0 * a0)]
+    hp = [(1.0 + cosw) / (2.0 * a0), -(1.0 + cosw) / a0, (1.0 + cosw) / (2.0 * a0)]
+    return np.array([sr, freq] + fb + lp + fb + hp, dtype=np.float64)
+
+# --- Profiling (--profile) ---
+@contextmanager
+def stage(record, name):
+    """
+    Record one build stage (no-op if record is None): wall time while
+    tracemalloc is off, traced allocations while it is on.
+    """
+    if record is None:
+        yield
+        return
+    entry = record["stages"].setdefault(name, {})
+    if not tracemalloc.is_tracing():
+        t0 = time.perf_counter()
+        yield
+        entry["ms"] = round((time.perf_counter() - t0) * 1e3, 4)
+        return
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    yield
+    current, peak = tracemalloc.get_traced_memory()
+    entry.update(alloc_bytes=current - before, peak_bytes=peak - before)
+
+def build_decoder(norm='SN3D', weighting='basic', record=None):
+    with stage(record, "sh_eval"):
+        rows = [sh16_n3d(azi, ele) for azi, ele in speakers]
+    with stage(record, "normalize"):
+        K = np.asarray([apply_normalization(sh, norm) for sh in rows], dtype=np.float64)
+    with stage(record, "pinv"):
+        D = np.linalg.pinv(K).T
+        if weighting == 'maxre':
+            D = D * maxre_gains()
+    with stage(record, "round"):
+        M = D.round(7)
+    if record is not None:
+        s = np.linalg.svd(K, compute_uv=False)
+        err = M - D
+        record.update({
+            "cond": float(s[0] / s[-1]) if s[-1] > 0 else float("inf"),
+            "singular_values": [float(v) for v in s],
+            "rank": int(np.linalg.matrix_rank(K)),
+            "rounding_error_max": float(np.abs(err).max()),
+            "rounding_error_rms": float(np.sqrt(np.mean(err ** 2))),
+        })
+    return M
+
+def new_record(norm, weighting):
+    return {"layout": "Oct", "order": 3, "norm": norm, "weighting": weighting,
+            "speakers": len(speakers), "channels": 16,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "stages": {}}
+
+def profile_allocations(record, out):
+    """Traced rebuild for the allocation figures, then write the record."""
+    tracemalloc.start()
+    build_decoder(record["norm"], record["weighting"], record)
+    tracemalloc.stop()
+    record["total_ms"] = round(sum(s["ms"] for s in record["stages"].values()), 4)
+    out.write(json.dumps(record) + "\n")
+
+def write_matrix(M, outname):
     with open(outname, "w") as f:
-        for row in M:
-            for element in row:
-                f.write(f"{element};\n")
+        for element in np.ravel(M):
+            f.write(f"{element};\n")
     print(f"Wrote {outname}")
 
+def write_decoder(norm, record=None):
+    write_matrix(build_decoder(norm, 'basic', record), f"3OA_Oct_{norm}.txt")
+
+def write_dual_band(norm, freq, sr, record=None):
+    write_matrix(build_decoder(norm, 'basic'), f"3OA_Oct_{norm}_LF.txt")
+    write_matrix(build_decoder(norm, 'maxre', record), f"3OA_Oct_{norm}_HF.txt")
+    write_matrix(build_crossover(freq, sr), "3OA_Oct_Xover.txt")
+
 def main():
     parser = argparse.ArgumentParser(description="Octagonal 3rd-order Ambisonics decoder (SN3D/N3D).")
     parser.add_argument("--norm", choices=["SN3D", "N3D"],
                         help="Normalization to use. If omitted, outputs both.")
+    parser.add_argument("--dual-band", action="store_true",
+                        help="Also write LF/HF shelf matrices and crossover coefficients.")
+    parser.add_argument("--xover", type=float, default=400.0,
+                        help="Crossover frequency in Hz (default 400).")
+    parser.add_argument("--sr", type=float, default=48000.0,
+                        help="Sample rate the crossover is designed for (default 48000).")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="Append per-stage timing/allocations and conditioning of K as "
+                             "JSON lines to FILE ('-' for stdout).")
     args = parser.parse_args()
 
-    if args.norm:
-        write_decoder(args.norm)
-    else:
-        for norm in ["SN3D", "N3D"]:
-            write_decoder(norm)
+    out = None
+    if args.profile:
+        out = sys.stdout if args.profile == "-" else open(args.profile, "a")
+    # with the JSON lines on stdout, the 'Wrote' messages go to stderr
+    with redirect_stdout(sys.stderr if out is sys.stdout else sys.stdout):
+        for norm in ([args.norm] if args.norm else ["SN3D", "N3D"]):
+            basic = new_record(norm, 'basic') if out else None
+            maxre = new_record(norm, 'maxre') if out and args.dual_band else None
+            write_decoder(norm, basic)
+            if args.dual_band:
+                write_dual_band(norm, args.xover, args.sr, maxre)
+            for record in (basic, maxre):
+                if record is not None:
+                    profile_allocations(record, out)
+    if out is not None and out is not sys.stdout:
+        out.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+import sys
+import lzma
+import zlib
+import struct
+import argparse
+import numpy as np
+
+from ambiPipe import open_input, open_output, stream_order, is_stream, log
+
+"""
+Seekable B-format Archive (.amba)
+---------------------------------
+A compact store for raw ambisonic captures (writesf~ output of main.pd).
+Audio is cut into fixed-length chunks and every channel of every chunk is
+stored as its own plane, so a reader decodes only the chunks of the
+requested time range and only the planes of the requested channels.
+
+    header   magic b"AMBA", version, order, channels, rate, chunk frames,
+             total frames, index offset, norm, codec, shuffle,
+             then one sample-type byte per channel (0 = float32, 1 = float16)
+    planes   chunk 0 channel 0, chunk 0 channel 1, ..., chunk 1 channel 0, ...
+    index    (offset u64, size u32) per chunk and channel, at the end
+
+Seeking is O(1): chunk = frame // chunk frames, then one index lookup per
+channel. Quantization is chosen per order (--f16-from 2 stores orders 2 and
+up as float16, about -66 dB relative error, where the higher orders carry
+little energy). Planes are optionally compressed losslessly (zlib or lzma)
+after a byte shuffle that groups sign/exponent bytes together.
+
+Archives are also valid inputs for every tool that reads through
+ambiPipe.open_input (file name ending in '.amba').
+
+USAGE:
+    python ambiArchive.py pack rec.wav rec.amba --norm N3D --f16-from 2
+    python ambiArchive.py unpack rec.amba part.wav --start 60 --end 90 --order 1
+    python ambiArchive.py unpack rec.amba - --start 60 | python ambiDecode.py - out.wav --dec ...
+    python ambiArchive.py info rec.amba
+"""
+
+MAGIC = b"AMBA"
+VERSION = 1
+HEADER = struct.Struct("<4sBbHIIQQ4sBB2x")
+INDEX = np.dtype([("offset", "<u8"), ("size", "<u4")])
+CODECS = {"none": 0, "zlib": 1, "lzma": 2}
+SAMPLE_TYPES = [np.dtype("<f4"), np.dtype("<f2")]
+
+def parse_channels(spec, channels):
+    """'0-3,8' -> [0, 1, 2, 3, 8]."""
+    out = []
+    for part in spec.split(","):
+        lo, _, hi = part.partition("-")
+        out.extend(range(int(lo), int(hi or lo) + 1))
+    if not out or min(out) < 0 or max(out) >= channels:
+        raise ValueError(f"channels {spec} out of range 0-{channels - 1}")
+    return out
+
+def _shuffle(raw, itemsize):
+    return np.frombuffer(raw, np.uint8).reshape(-1, itemsize).T.tobytes()
+
+def _unshuffle(raw, itemsize):
+    return np.frombuffer(raw, np.uint8).reshape(itemsize, -1).T.tobytes()
+
+class ArchiveWriter:
+    def __init__(self, path, channels, rate, order=-1, norm=None, chunk_frames=48000,
+                 types=None, codec="zlib", level=6, shuffle=True):
+        self.f = open(path, "wb")
+        self.channels = channels
+        self.rate = rate
+        self.order = order
+        self.norm = norm
+        self.chunk_frames = chunk_frames
+        self.types = np.zeros(channels, dtype=np.uint8) if types is None else np.asarray(types, np.uint8)
+        self.codec = CODECS[codec]
+        self.level = level
+        self.shuffle = shuffle and self.codec != 0
+        self.buffer = np.zeros((chunk_frames, channels), dtype=np.float32)
+        self.fill = 0
+        self.frames = 0
+        self.index = []
+        self._write_header(0)
+        self.f.write(self.types.tobytes())
+
+    def _write_header(self, index_offset):
+        norm = (self.norm or "").encode().ljust(4)[:4]
+        self.f.write(HEADER.pack(MAGIC, VERSION, self.order, self.channels, self.rate,
+                                 self.chunk_frames, self.frames, index_offset, norm,
+                                 self.codec, self.shuffle))
+
+    def _compress(self, raw):
+        if self.codec == CODECS["zlib"]:
+            return zlib.compress(raw, self.level)
+        if self.codec == CODECS["lzma"]:
+            return lzma.compress(raw, preset=self.level)
+        return raw
+
+    def _flush_chunk(self):
+        chunk = self.buffer[:self.fill]
+        for c in range(self.channels):
+            sample_type = SAMPLE_TYPES[self.types[c]]
+            raw = chunk[:, c].astype(sample_type).tobytes()
+            if self.shuffle:
+                raw = _shuffle(raw, sample_type.itemsize)
+            data = self._compress(raw)
+            self.index.append((self.f.tell(), len(data)))
+            self.f.write(data)
+        self.frames += self.fill
+        self.fill = 0
+
+    def write(self, block):
+        block = np.asarray(block, dtype=np.float32)
+        while len(block):
+            n = min(len(block), self.chunk_frames - self.fill)
+            self.buffer[self.fill:self.fill + n] = block[:n, :self.channels]
+            self.fill += n
+            block = block[n:]
+            if self.fill == self.chunk_frames:
+                self._flush_chunk()
+
+    def close(self):
+        if self.f.closed:
+            return
+        if self.fill:
+            self._flush_chunk()
+        index_offset = self.f.tell()
+        self.f.write(np.array(self.index, dtype=INDEX).tobytes())
+        self.f.seek(0)
+        self._write_header(index_offset)
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ArchiveReader:
+    """
+    Random-access reader. `channels` selects a subset (list of indices);
+    .read(n)/.blocks(n) then stream only those, like WavReader.
+    """
+
+    def __init__(self, path, channels=None):
+        self.f = open(path, "rb")
+        (magic, version, self.archive_order, self.total_channels, self.rate, self.chunk_frames,
+         self.frames, index_offset, norm, self.codec, self.shuffle) = HEADER.unpack(self.f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not an AMBA archive")
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported archive version {version}")
+        self.norm = norm.decode().strip() or None
+        self.types = np.frombuffer(self.f.read(self.total_channels), dtype=np.uint8)
+        chunks = -(-self.frames // self.chunk_frames)
+        self.f.seek(index_offset)
+        self.index = np.frombuffer(self.f.read(chunks * self.total_channels * INDEX.itemsize),
+                                   dtype=INDEX).reshape(chunks, self.total_channels)
+        self.select(channels)
+        self.pos = 0
+
+    def select(self, channels):
+        self.selected = list(range(self.total_channels)) if channels is None else list(channels)
+        self.channels = len(self.selected)
+        self.cache = (None, None)
+        # a subset is only B-format if it is a complete lower order
+        order = int(np.sqrt(self.channels)) - 1
+        full = self.selected == list(range((order + 1) ** 2))
+        self.order = min(order, self.archive_order) if full and self.archive_order >= 0 else -1
+
+    def _plane(self, chunk, c):
+        offset, size = self.index[chunk, c]
+        self.f.seek(int(offset))
+        raw = self.f.read(int(size))
+        if self.codec == CODECS["zlib"]:
+            raw = zlib.decompress(raw)
+        elif self.codec == CODECS["lzma"]:
+            raw = lzma.decompress(raw)
+        sample_type = SAMPLE_TYPES[self.types[c]]
+        if self.shuffle:
+            raw = _unshuffle(raw, sample_type.itemsize)
+        return np.frombuffer(raw, dtype=sample_type)
+
+    def _chunk(self, chunk):
+        if self.cache[0] != chunk:
+            n = min(self.chunk_frames, self.frames - chunk * self.chunk_frames)
+            data = np.empty((n, self.channels), dtype=np.float32)
+            for i, c in enumerate(self.selected):
+                data[:, i] = self._plane(chunk, c)
+            self.cache = (chunk, data)
+        return self.cache[1]
+
+    def read_range(self, start, n):
+        """Frames [start, start + n) of the selected channels, float32 (frames, channels)."""
+        start = min(max(start, 0), self.frames)
+        end = min(start + n, self.frames)
+        out = np.empty((end - start, self.channels), dtype=np.float32)
+        pos = start
+        while pos < end:
+            chunk, offset = divmod(pos, self.chunk_frames)
+            data = self._chunk(chunk)[offset:offset + end - pos]
+            out[pos - start:pos - start + len(data)] = data
+            pos += len(data)
+        return out
+
+    def seek(self, frame):
+        self.pos = min(max(frame, 0), self.frames)
+
+    def read(self, n):
+        out = self.read_range(self.pos, n)
+        self.pos += len(out)
+        return out
+
+    def blocks(self, blocksize, end=None):
+        end = self.frames if end is None else min(end, self.frames)
+        while self.pos < end:
+            yield self.read(min(blocksize, end - self.pos))
+
+    def stored_bytes(self):
+        return int(self.index["size"].sum())
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def order_types(order, channels, f16_from):
+    """Sample type per channel: float16 for ACN channels of order >= f16_from."""
+    types = np.zeros(channels, dtype=np.uint8)
+    if f16_from is not None and order >= 0:
+        types[f16_from ** 2:(order + 1) ** 2] = 1
+    return types
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack/unpack seekable, compressed B-format archives.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("pack", help="WAV or stream -> archive")
+    p.add_argument("infile", help="WAV file or '-' for a stream")
+    p.add_argument("outfile", help="Archive (.amba)")
+    p.add_argument("--order", type=int, help="Ambisonic order (default: from header/channel count)")
+    p.add_argument("--norm", choices=["N3D", "SN3D"])
+    p.add_argument("--chunk", type=float, default=1.0, help="Chunk length in seconds")
+    p.add_argument("--f16-from", type=int, metavar="L", help="Store orders >= L as float16")
+    p.add_argument("--codec", choices=sorted(CODECS), default="zlib")
+    p.add_argument("--level", type=int, default=6)
+    p = sub.add_parser("unpack", help="Archive time range / channels -> WAV or stream")
+    p.add_argument("infile", help="Archive (.amba)")
+    p.add_argument("outfile", help="WAV (32-bit float) or '-' for a stream")
+    p.add_argument("--start", type=float, default=0.0, help="Start in seconds")
+    p.add_argument("--end", type=float, help="End in seconds (default: end of file)")
+    p.add_argument("--channels", help="Channel subset, e.g. '0-3,8'")
+    p.add_argument("--order", type=int, help="Only the first (N+1)^2 channels")
+    p.add_argument("--blocksize", type=int, default=8192)
+    p = sub.add_parser("info", help="Print the archive header")
+    p.add_argument("infile")
+    args = parser.parse_args()
+
+    if args.cmd == "pack":
+        with open_input(args.infile) as reader:
+            order = stream_order(reader) if args.order is None else args.order
+            norm = args.norm or getattr(reader, "norm", None)
+            chunk = max(1, int(round(args.chunk * reader.rate)))
+            types = order_types(order, reader.channels, args.f16_from)
+            with ArchiveWriter(args.outfile, reader.channels, reader.rate, order, norm, chunk,
+                               types, args.codec, args.level) as writer:
+                for block in reader.blocks(chunk):
+                    writer.write(block)
+        with ArchiveReader(args.outfile) as a:
+            raw = a.frames * a.total_channels * 4
+            log(f"Wrote {args.outfile}: {a.frames} frames, {a.stored_bytes() / max(raw, 1) * 100:.1f}% "
+                f"of float32")
+    elif args.cmd == "unpack":
+        try:
+            with ArchiveReader(args.infile) as reader:
+                if args.channels:
+                    reader.select(parse_channels(args.channels, reader.total_channels))
+                elif args.order is not None:
+                    reader.select(range(min((args.order + 1) ** 2, reader.total_channels)))
+                reader.seek(int(round(args.start * reader.rate)))
+                end = None if args.end is None else int(round(args.end * reader.rate))
+                with open_output(args.outfile, reader.channels, reader.rate, reader.order,
+                                 reader.norm) as writer:
+                    for block in reader.blocks(args.blocksize, end):
+                        writer.write(block)
+        except ValueError as e:
+            sys.exit(f"{args.infile}: {e}")
+        if not is_stream(args.outfile):
+            print(f"Wrote {args.outfile}")
+    else:
+        with ArchiveReader(args.infile) as a:
+            raw = a.frames * a.total_channels * 4
+            codec = {v: k for k, v in CODECS.items()}[a.codec]
+            f16 = [c for c in range(a.total_channels) if a.types[c]]
+            print(f"channels={a.total_channels} rate={a.rate} order={a.archive_order} norm={a.norm or '-'} "
+                  f"frames={a.frames} ({a.frames / a.rate:.1f}s) chunk={a.chunk_frames} "
+                  f"chunks={len(a.index)} codec={codec} float16={f16 or '-'} "
+                  f"size={a.stored_bytes() / max(raw, 1) * 100:.1f}% of float32")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except BrokenPipeError:
+        # downstream stage exited early (e.g. `| head`)
+        sys.stderr.close()
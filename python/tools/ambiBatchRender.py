@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import hashlib
+import argparse
+import numpy as np
+
+from ambiSH import LAYOUTS, sh, acn_degree, build_decoder, read_decoder, parse_coefficient_name
+from ambiWav import WavReader, WavWriter
+from ambiDecode import Decoder, design_crossover
+from ambiPipe import log
+
+"""
+Scene Manifest Batch Renderer
+-----------------------------
+Renders one show to several rooms in a single pass. Every source in the
+manifest is encoded once to a B-format stem, the stems are summed into a
+shared bed, and every target layout is decoded from that bed block by block.
+
+Stems are cached in the manifest's cache directory, keyed by a hash of the
+source audio, its trajectory/gain and the bed format. Re-rendering after a
+change only re-encodes the sources whose audio or motion changed.
+
+MANIFEST (JSON, paths relative to the manifest):
+    {
+      "rate": 48000, "order": 3, "norm": "N3D", "cache": ".stems",
+      "bed": "show_bed.wav",                          (optional)
+      "sources": [
+        {"name": "vox", "file": "vox.wav", "gain": 1.0,
+         "trajectory": [[0.0, 30, 0], [4.0, 90, 15]]}   (t sec, azi deg, ele deg)
+      ],
+      "targets": [
+        {"layout": "Oct", "out": "show_Oct.wav"},
+        {"layout": "VCCM", "order": 3, "norm": "N3D", "dual_band": true,
+         "out": "show_VCCM.wav"},
+        {"decoder": "../ambiCoefficients/1OA_Stereo_N3D.txt", "out": "show_St.wav"}
+      ]
+    }
+    Targets use a generator layout (Stereo, Quad, Oct, VCCM) with the same
+    pinv math as python/3OA-N3D, or an existing coefficient file. Order and
+    norm default to the bed's.
+
+USAGE:
+    python ambiBatchRender.py show.json
+    python ambiBatchRender.py show.json --force vox     (re-encode one source)
+"""
+
+# Bump when the encoding math changes so old stems are not reused
+ENCODER_VERSION = 1
+
+def interpolate_trajectory(trajectory, t):
+    """
+    Keyframes [[t, azi, ele], ...] (degrees) -> azi, ele in radians at times t.
+    Extra columns (e.g. the distance of ambiDistanceRender.py scenes) are ignored.
+    """
+    k = np.atleast_2d(np.asarray(trajectory, dtype=np.float64))
+    if k.ndim != 2 or k.shape[1] < 3:
+        raise ValueError(f"trajectory keyframes must be [t, azi, ele] rows, got shape {k.shape}")
+    k = k[:, :3]
+    k = k[np.argsort(k[:, 0], kind="stable")]
+    azi = np.unwrap(np.radians(k[:, 1]))   # shortest way round between keyframes
+    return np.interp(t, k[:, 0], azi), np.interp(t, k[:, 0], np.radians(k[:, 2]))
+
+def file_hash(path, chunk=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(chunk), b""):
+            h.update(data)
+    return h.hexdigest()
+
+def stem_key(source, audio_hash, rate, order, norm):
+    desc = {"audio": audio_hash, "trajectory": source.get("trajectory", [[0, 0, 0]]),
+            "gain": source.get("gain", 1.0), "rate": rate, "order": order,
+            "norm": norm, "version": ENCODER_VERSION}
+    return hashlib.sha256(json.dumps(desc, sort_keys=True).encode()).hexdigest()[:24]
+
+def encode_stem(path, source, order, norm, out_path, blocksize=8192):
+    """Encode the first channel of `path` along its trajectory, block by block."""
+    trajectory = source.get("trajectory", [[0, 0, 0]])
+    gain = float(source.get("gain", 1.0))
+    tmp = out_path + ".part"
+    with WavReader(path) as reader, WavWriter(tmp, (order + 1) ** 2, reader.rate) as writer:
+        for block in reader.blocks(blocksize):
+            t = (reader.pos - len(block) + np.arange(len(block))) / reader.rate
+            azi, ele = interpolate_trajectory(trajectory, t)
+            writer.write(sh(order, azi, ele, norm) * (gain * block[:, :1]))
+    os.replace(tmp, out_path)   # a crash never leaves a half-written stem in the cache
+
+def convert_norm(D, order, src, dst):
+    """Decoder for `dst`-normalized input -> decoder for `src`-normalized input."""
+    if src.upper() == dst.upper():
+        return D
+    scale = np.sqrt(2.0 * acn_degree(order) + 1.0)
+    return D / scale if src.upper() == "N3D" else D * scale
+
+def target_decoder(target, base, rate, bed_order, bed_norm):
+    if "decoder" in target:
+        path = os.path.join(base, target["decoder"])
+        order, _, norm = parse_coefficient_name(path)
+        D_lf = read_decoder(path, order)
+        hf = target.get("decoder_hf")
+        D_hf = read_decoder(os.path.join(base, hf), order) if hf else None
+    else:
+        order = target.get("order", bed_order)
+        norm = target.get("norm", bed_norm)
+        speakers = LAYOUTS[target["layout"]]
+        D_lf = build_decoder(speakers, order, norm)
+        D_hf = build_decoder(speakers, order, norm, "maxre") if target.get("dual_band") else None
+    if order > bed_order:
+        raise ValueError(f"target {target['out']} needs order {order}, bed is {bed_order}")
+    D_lf = convert_norm(D_lf, order, bed_norm, norm)
+    if D_hf is not None:
+        D_hf = convert_norm(D_hf, order, bed_norm, norm)
+    crossover = design_crossover(target.get("xover", 400.0), rate) if D_hf is not None else None
+    return Decoder(D_lf, D_hf, crossover)
+
+def render(manifest_path, force=(), blocksize=8192):
+    with open(manifest_path) as f:
+        scene = json.load(f)
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    rate = scene.get("rate", 48000)
+    order = scene.get("order", 3)
+    norm = scene.get("norm", "N3D")
+    cache = os.path.join(base, scene.get("cache", ".stems"))
+    os.makedirs(cache, exist_ok=True)
+
+    # 1. encode (or reuse) one stem per source
+    stems = []
+    for source in scene["sources"]:
+        path = os.path.join(base, source["file"])
+        with WavReader(path) as r:
+            if r.rate != rate:
+                raise ValueError(f"{path} is {r.rate} Hz, scene is {rate} Hz")
+        stem = os.path.join(cache, stem_key(source, file_hash(path), rate, order, norm) + ".wav")
+        name = source.get("name", source["file"])
+        if os.path.exists(stem) and name not in force:
+            log(f"{name}: cached")
+        else:
+            log(f"{name}: encoding")
+            encode_stem(path, source, order, norm, stem, blocksize)
+        stems.append(stem)
+
+    # 2. sum stems into the bed and decode every target from it, block by block
+    readers = [WavReader(s) for s in stems]
+    frames = max((r.frames for r in readers), default=0)
+    nch = (order + 1) ** 2
+    targets = scene.get("targets", [])
+    decoders = [target_decoder(t, base, rate, order, norm) for t in targets]
+    writers = [WavWriter(os.path.join(base, t["out"]), d.speakers, rate)
+               for t, d in zip(targets, decoders)]
+    bed_writer = WavWriter(os.path.join(base, scene["bed"]), nch, rate) if "bed" in scene else None
+
+    for start in range(0, frames, blocksize):
+        n = min(blocksize, frames - start)
+        bed = np.zeros((n, nch), dtype=np.float64)
+        for r in readers:
+            block = r.read(n)
+            bed[:len(block)] += block
+        if bed_writer:
+            bed_writer.write(bed)
+        for d, w in zip(decoders, writers):
+            w.write(d.process(bed))
+
+    for obj in readers + writers + decoders + ([bed_writer] if bed_writer else []):
+        obj.close()
+    for t in targets:
+        log(f"Wrote {t['out']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a scene manifest to several layouts via cached B-format stems.")
+    parser.add_argument("manifest", help="Scene manifest (JSON)")
+    parser.add_argument("--force", action="append", default=[],
+                        help="Re-encode this source name even if cached (repeatable)")
+    parser.add_argument("--blocksize", type=int, default=8192)
+    args = parser.parse_args()
+    try:
+        render(args.manifest, set(args.force), args.blocksize)
+    except (ValueError, KeyError) as e:
+        sys.exit(f"{args.manifest}: {e}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except BrokenPipeError:
+        # downstream stage exited early (e.g. `| head`)
+        sys.stderr.close()
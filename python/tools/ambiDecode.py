@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from ambiSH import read_list, read_decoder, parse_coefficient_name
+from ambiPipe import open_input, open_output, is_stream, log
+
+"""
+Offline B-format Decoder (single- or dual-band)
+-----------------------------------------------
+Decodes a raw ambisonic recording (e.g. the writesf~ output of main.pd, ACN
+channel order) to speaker feeds with a coefficient list from
+'ambiCoefficients'. With --hf it decodes dual-band: the SH channels are split
+by a phase-matched Linkwitz-Riley crossover, the low band goes through the LF
+(basic) matrix and the high band through the HF (max-rE) matrix. Generate the
+three files with `calc*ArrayPdFormat.py --dual-band` in python/3OA-N3D.
+Either file may be '-' (or a named pipe) to read/write an AMBP float32
+stream instead of WAV, see ambiPipe.py.
+
+The crossover runs on all SH channels at once, one block at a time, and keeps
+its state per channel. Output is therefore bit-identical for any --blocksize
+and any --jobs split (each job filters its own group of channels; the matrix
+sums always run in channel order).
+
+USAGE:
+    python ambiDecode.py in.wav out.wav --dec 3OA_Oct_N3D.txt
+
+    python ambiDecode.py in.wav out.wav --dec 3OA_Oct_N3D_LF.txt \\
+        --hf 3OA_Oct_N3D_HF.txt --xover 3OA_Oct_Xover.txt --jobs 4
+
+    python ambiPipe.py cat rec.wav | python ambiDecode.py - - --dec 3OA_Quad_N3D.txt | ...
+
+FLAGS:
+    --dec FILE        Decoder (LF decoder when --hf is given).
+    --hf FILE         HF decoder; enables dual-band decoding.
+    --xover FILE|HZ   Crossover file from --dual-band, or a frequency in Hz
+                      (default 400). Redesigned if the file's sample rate
+                      differs from the input.
+    --blocksize N     Frames per block (default 4096).
+    --jobs N          Worker threads, each filtering a group of channels.
+"""
+
+try:
+    from scipy.signal import sosfilt
+except ImportError:  # pure numpy fallback, much slower
+    sosfilt = None
+
+def design_crossover(freq, sr):
+    """LR4 as (lp_sos, hp_sos), each two identical Butterworth biquads."""
+    w0 = 2.0 * np.pi * freq / sr
+    cosw = np.cos(w0)
+    alpha = np.sin(w0) / np.sqrt(2.0)
+    a0 = 1.0 + alpha
+    a = [1.0, -2.0 * cosw / a0, (1.0 - alpha) / a0]
+    lp = [(1.0 - cosw) / (2.0 * a0), (1.0 - cosw) / a0, (1.0 - cosw) / (2.0 * a0)]
+    hp = [(1.0 + cosw) / (2.0 * a0), -(1.0 + cosw) / a0, (1.0 + cosw) / (2.0 * a0)]
+    return np.array([lp + a] * 2), np.array([hp + a] * 2)
+
+def read_crossover(path):
+    """Crossover file (sr, freq, LP biquad~, HP biquad~) -> (sr, freq, lp_sos, hp_sos)."""
+    v = read_list(path)
+    if len(v) != 12:
+        raise ValueError(f"{path}: expected 12 values, got {len(v)}")
+
+    def sos(fb1, fb2, ff1, ff2, ff3):
+        return np.array([[ff1, ff2, ff3, 1.0, -fb1, -fb2]] * 2)
+
+    return v[0], v[1], sos(*v[2:7]), sos(*v[7:12])
+
+def _sosfilt_numpy(sos, x, zi):
+    """Transposed direct form II, vectorized over channels; updates zi in place."""
+    y = np.empty_like(x)
+    for s, (b0, b1, b2, _, a1, a2) in enumerate(sos):
+        z1, z2 = zi[s, 0], zi[s, 1]
+        for n in range(x.shape[0]):
+            xn = x[n]
+            yn = b0 * xn + z1
+            z1 = b1 * xn - a1 * yn + z2
+            z2 = b2 * xn - a2 * yn
+            y[n] = yn
+        zi[s, 0], zi[s, 1] = z1, z2
+        x = y.copy()
+    return y, zi
+
+class Crossover:
+    """Phase-matched LR4 split of a (frames, channels) stream with per-channel state."""
+
+    def __init__(self, lp_sos, hp_sos, channels):
+        self.lp_sos = lp_sos
+        self.hp_sos = hp_sos
+        self.zi_lp = np.zeros((len(lp_sos), 2, channels))
+        self.zi_hp = np.zeros((len(hp_sos), 2, channels))
+
+    def process(self, block):
+        x = np.asarray(block, dtype=np.float64)
+        if sosfilt is not None:
+            lo, self.zi_lp = sosfilt(self.lp_sos, x, axis=0, zi=self.zi_lp)
+            hi, self.zi_hp = sosfilt(self.hp_sos, x, axis=0, zi=self.zi_hp)
+        else:
+            lo, self.zi_lp = _sosfilt_numpy(self.lp_sos, x, self.zi_lp)
+            hi, self.zi_hp = _sosfilt_numpy(self.hp_sos, x, self.zi_hp)
+        return lo, hi
+
+def _mix(out, x, D):
+    # Channel-ordered accumulation: identical sums whatever the block size or split
+    for c in range(D.shape[1]):
+        out += x[:, c, None] * D[:, c]
+
+class Decoder:
+    """
+    Block decoder. D_lf is the single-band matrix when D_hf is None.
+    Matrices are (num speakers, num channels), as read from 'ambiCoefficients'.
+    """
+
+    def __init__(self, D_lf, D_hf=None, crossover=None, jobs=1):
+        self.D_lf = np.asarray(D_lf, dtype=np.float64)
+        self.D_hf = None if D_hf is None else np.asarray(D_hf, dtype=np.float64)
+        self.channels = self.D_lf.shape[1]
+        self.speakers = self.D_lf.shape[0]
+        self.groups = np.array_split(np.arange(self.channels), max(1, min(jobs, self.channels)))
+        self.pool = ThreadPoolExecutor(len(self.groups)) if len(self.groups) > 1 else None
+        if self.D_hf is not None:
+            lp_sos, hp_sos = crossover
+            self.filters = [Crossover(lp_sos, hp_sos, len(g)) for g in self.groups]
+
+    def _split(self, i, x):
+        return self.filters[i].process(x[:, self.groups[i]])
+
+    def process(self, block):
+        x = np.asarray(block[:, :self.channels], dtype=np.float64)
+        out = np.zeros((x.shape[0], self.speakers))
+        if self.D_hf is None:
+            _mix(out, x, self.D_lf)
+            return out
+        if self.pool is not None:
+            bands = list(self.pool.map(self._split, range(len(self.groups)), [x] * len(self.groups)))
+        else:
+            bands = [self._split(0, x)]
+        lo = np.concatenate([b[0] for b in bands], axis=1)
+        hi = np.concatenate([b[1] for b in bands], axis=1)
+        _mix(out, lo, self.D_lf)
+        _mix(out, hi, self.D_hf)
+        return out
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline single/dual-band Ambisonics decoder.")
+    parser.add_argument("infile", help="B-format WAV (ACN order) or '-' for a stream")
+    parser.add_argument("outfile", help="Speaker-feed WAV (32-bit float) or '-' for a stream")
+    parser.add_argument("--dec", required=True, help="Decoder coefficient file (LF with --hf)")
+    parser.add_argument("--hf", help="HF (max-rE) coefficient file; enables dual-band")
+    parser.add_argument("--xover", default="400",
+                        help="Crossover coefficient file or frequency in Hz (default 400)")
+    parser.add_argument("--blocksize", type=int, default=4096)
+    parser.add_argument("--jobs", type=int, default=1)
+    args = parser.parse_args()
+
+    D_lf = read_decoder(args.dec)
+    D_hf = read_decoder(args.hf) if args.hf else None
+    if D_hf is not None and D_hf.shape != D_lf.shape:
+        sys.exit(f"LF {D_lf.shape} and HF {D_hf.shape} decoders do not match")
+
+    with open_input(args.infile) as reader:
+        norm = parse_coefficient_name(args.dec)[2]
+        if getattr(reader, "norm", None) not in (None, norm):
+            log(f"warning: {args.infile} is {reader.norm}, {args.dec} expects {norm}")
+        if reader.channels < D_lf.shape[1]:
+            sys.exit(f"{args.infile} has {reader.channels} channels, decoder needs {D_lf.shape[1]}")
+        crossover = None
+        if D_hf is not None:
+            try:
+                freq = float(args.xover)
+                crossover = design_crossover(freq, reader.rate)
+            except ValueError:
+                sr, freq, lp_sos, hp_sos = read_crossover(args.xover)
+                if sr != reader.rate:
+                    log(f"{args.xover} is for {sr:g} Hz, redesigning at {reader.rate} Hz")
+                    lp_sos, hp_sos = design_crossover(freq, reader.rate)
+                crossover = (lp_sos, hp_sos)
+
+        decoder = Decoder(D_lf, D_hf, crossover, args.jobs)
+        with open_output(args.outfile, decoder.speakers, reader.rate) as writer:
+            for block in reader.blocks(args.blocksize):
+                writer.write(decoder.process(block))
+        decoder.close()
+    if not is_stream(args.outfile):
+        print(f"Wrote {args.outfile}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except BrokenPipeError:
+        # downstream stage exited early (e.g. `| head`)
+        sys.stderr.close()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+import sys
+import json
+import os
+import argparse
+import numpy as np
+
+from ambiSH import sh
+from ambiWav import WavReader
+from ambiPipe import open_output, is_stream, log
+
+"""
+Distance and Doppler Renderer
+-----------------------------
+Encodes mono sources that move in azimuth, elevation *and* distance to one
+B-format bed, with the distance cues ambiNilla3 does not have:
+
+    - gain roll-off      ref / max(r, ref)  (1/r beyond the reference distance)
+    - air absorption     one-pole lowpass, cutoff falls with distance
+                         (absorption ~ f^2, --air dB/m at 10 kHz)
+    - Doppler            propagation delay r / c read from a fractional
+                         (4-point Lagrange) delay line
+
+All sources are processed together, one block at a time: the delay lines are
+one preallocated (sources, length) buffer written and read with vectorized
+indexing, the lowpass runs as batched sub-block products, the keyframes of
+all sources are interpolated with one searchsorted on a shared time axis, and
+the SH gains are evaluated every --control frames and interpolated per sample.
+Nothing in the renderer's block loop is per source or per sample in Python
+(only the lowpass carry steps once per sub-block), so 100+ moving sources
+render far faster than real time.
+
+The lowpass coefficient is held per block (state carries over), the delay is
+never shorter than 2 samples (1.4 cm at 48 kHz).
+
+SCENE (JSON, same layout as ambiBatchRender.py manifests):
+    {
+      "rate": 48000, "order": 3, "norm": "N3D",
+      "sources": [
+        {"name": "car", "file": "car.wav", "gain": 1.0,
+         "trajectory": [[0.0, 90, 0, 40], [3.0, 0, 0, 2], [6.0, 270, 0, 40]]}
+      ]
+    }
+    Keyframes are [t sec, azi deg, ele deg, distance m]; distance defaults
+    to the reference distance when a keyframe has only three values.
+    ambiBatchRender.py renders the same scene without the distance cues
+    (it ignores the fourth column).
+
+USAGE:
+    python ambiDistanceRender.py scene.json bed.wav
+    python ambiDistanceRender.py scene.json - --no-doppler | python ambiDecode.py - out.wav --dec ...
+
+FLAGS:
+    --ref M         Reference distance, no roll-off inside it (default 1.0)
+    --speed M/S     Speed of sound (default 343)
+    --air DB        Air absorption at 10 kHz in dB/m (default 0.15, 0 = off)
+    --no-doppler    No propagation delay (distance only sets gain and filter)
+    --blocksize N   Frames per block (default 2048)
+    --control N     Frames between SH gain updates (default 32)
+"""
+
+def load_trajectories(sources, ref):
+    """Keyframe arrays (t, azi rad, ele rad, dist m) per source, sorted and unwrapped."""
+    keys = []
+    for source in sources:
+        rows = [list(k) + [ref] * (4 - len(k)) for k in source.get("trajectory", [[0, 0, 0]])]
+        k = np.asarray(rows, dtype=np.float64)
+        k = k[np.argsort(k[:, 0], kind="stable")]
+        k[:, 1] = np.unwrap(np.radians(k[:, 1]))   # shortest way round between keyframes
+        k[:, 2] = np.radians(k[:, 2])
+        keys.append(k)
+    return keys
+
+def one_pole(x, a, state, sub=32):
+    """
+    y[n] = (1 - a) x[n] + a y[n-1] for all rows at once, a per row.
+    The block is cut into sub-blocks of `sub` frames. Inside them the filter is
+    one batched product with a (rows, sub, sub) impulse-response matrix; only
+    the carry between sub-blocks is sequential. Returns y and the new state.
+    """
+    S, n = x.shape
+    J = n // sub
+    lag = np.arange(sub)[:, None] - np.arange(sub)
+    T = np.where(lag >= 0, a[:, None, None] ** np.maximum(lag, 0), 0.0).astype(x.dtype)  # (S, sub, sub)
+    y = np.matmul(x.reshape(S, J, sub) * (1.0 - a).astype(x.dtype)[:, None, None], T.transpose(0, 2, 1))
+    decay = a[:, None] ** np.arange(1, sub + 1)                                # (S, sub)
+    for j in range(J):
+        y[:, j] += decay * state[:, None]
+        state = y[:, j, -1]
+    return y.reshape(S, n), state.copy()
+
+class DelayLines:
+    """Preallocated fractional delay lines for all sources, (sources, length)."""
+
+    def __init__(self, sources, max_delay, blocksize):
+        length = 1 << int(np.ceil(np.log2(max_delay + blocksize + 4)))
+        self.mask = length - 1
+        self.buffer = np.zeros((sources, length), dtype=np.float32)
+        self.flat = self.buffer.reshape(-1)
+        self.rows = (np.arange(sources) * length).astype(np.int32)[:, None]
+        self.pos = 0
+
+    def process(self, x, delay):
+        """Write x (sources, frames), read it back `delay` samples later (same shape)."""
+        n = x.shape[1]
+        self.buffer[:, (self.pos + np.arange(n)) & self.mask] = x
+        # positions relative to the block start stay exact in float32
+        p = np.arange(n, dtype=np.float32) - np.maximum(delay, np.float32(2.0))
+        i = np.floor(p)
+        f = p - i
+        i = i.astype(np.int32) + np.int32((self.pos - 1) & self.mask)
+        xm1, x0, x1, x2 = (self.flat.take(self.rows + ((i + k) & self.mask)) for k in range(4))
+        # 4-point Lagrange interpolation, Horner form
+        c2 = 0.5 * (xm1 + x1) - x0
+        c3 = (x2 - xm1) * np.float32(1.0 / 6.0) + 0.5 * (x0 - x1)
+        c1 = x1 - x0 - c2 - c3
+        self.pos += n
+        return ((c3 * f + c2) * f + c1) * f + x0
+
+class DistanceRenderer:
+    def __init__(self, keys, rate, order, norm="N3D", ref=1.0, speed=343.0, air=0.15,
+                 doppler=True, blocksize=2048, control=32):
+        self.keys = keys
+        self.rate = rate
+        self.order = order
+        self.norm = norm
+        self.ref = ref
+        self.speed = speed
+        self.air = air
+        self.control = control
+        self.blocksize = blocksize // control * control
+        self.nodes = self.blocksize // control
+        self.max_delay = max(k[:, 3].max() for k in keys) / speed * rate if keys else 0.0
+        self.delays = DelayLines(len(keys), self.max_delay, self.blocksize) if doppler else None
+        self.state = np.zeros(len(keys))
+        self.frame = 0
+        if keys:
+            self._flatten_keys()
+        # per-sample interpolation weights within one control period
+        self.w = (np.arange(control) / control).astype(np.float32)
+
+    def _flatten_keys(self):
+        """All keyframes in one array; source s sits at offset s * span on a shared time axis."""
+        k = np.concatenate(self.keys)
+        counts = np.array([len(x) for x in self.keys])
+        self.key_start = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        self.key_last = self.key_start + counts - 1
+        self.t_first = k[self.key_start, 0][:, None]
+        self.t_last = k[self.key_last, 0][:, None]
+        self.t0 = k[:, 0].min()
+        self.span = k[:, 0].max() - self.t0 + 1.0
+        self.key_t = k[:, 0]
+        self.key_v = k[:, 1:4]
+        self.key_axis = (np.repeat(np.arange(len(self.keys)), counts) * self.span
+                         + (self.key_t - self.t0))
+
+    def _positions(self, t):
+        """azi, ele, dist at times t for every source, (sources, len(t)) each."""
+        S = len(self.keys)
+        # held constant outside each source's keyframes, as np.interp
+        tc = np.clip(t[None, :], self.t_first, self.t_last)             # (S, T)
+        axis = np.arange(S)[:, None] * self.span + (tc - self.t0)
+        i = np.searchsorted(self.key_axis, axis, side="right") - 1
+        i = np.clip(i, self.key_start[:, None], np.maximum(self.key_last - 1, self.key_start)[:, None])
+        j = np.minimum(i + 1, self.key_last[:, None])
+        before = t[None, :] < self.t_first
+        i = np.where(before, self.key_start[:, None], i)
+        j = np.where(before, i, j)
+        dt = self.key_t[j] - self.key_t[i]
+        # dt is 0 before the first or at a repeated last key time: take key j
+        w = np.where(dt > 0, (tc - self.key_t[i]) / np.where(dt > 0, dt, 1.0), 1.0)
+        out = self.key_v[i] + (self.key_v[j] - self.key_v[i]) * w[:, :, None]   # (S, T, 3)
+        return np.moveaxis(out, 2, 0)
+
+    def _cutoff_coef(self, dist):
+        """One-pole coefficient per source: -3 dB where absorption (~ f^2) reaches 3 dB."""
+        fc = 10000.0 * np.sqrt(3.0 / (self.air * np.maximum(dist, 1e-3)))
+        a = np.exp(-2.0 * np.pi * np.minimum(fc, 0.45 * self.rate) / self.rate)
+        return np.where(fc >= 0.45 * self.rate, 0.0, a)
+
+    def process(self, x):
+        """x: (sources, blocksize) mono input -> (blocksize, channels) B-format."""
+        S, C, K = len(self.keys), self.control, self.nodes
+        t = (self.frame + np.arange(K + 1) * C) / self.rate
+        azi, ele, dist = self._positions(t)                            # (S, K + 1)
+        gain = self.ref / np.maximum(dist, self.ref)
+        Y = sh(self.order, azi.ravel(), ele.ravel(), self.norm).reshape(S, K + 1, -1)
+        Y = (Y * gain[:, :, None]).astype(np.float32)
+
+        if self.delays is not None:
+            d = (dist * (self.rate / self.speed)).astype(np.float32)
+            d = d[:, :-1, None] + (d[:, 1:] - d[:, :-1])[:, :, None] * self.w
+            x = self.delays.process(x, d.reshape(S, -1))
+        if self.air > 0:
+            a = self._cutoff_coef(dist[:, K // 2])
+            x, self.state = one_pole(x, a, self.state, self.control)
+
+        # gains ramp linearly from node k to node k+1 over each control period
+        x = x.astype(np.float32).reshape(S, K, C)
+        out = np.einsum("skc,skh->kch", x * (1.0 - self.w), Y[:, :-1], optimize=True)
+        out += np.einsum("skc,skh->kch", x * self.w, Y[:, 1:], optimize=True)
+        self.frame += self.blocksize
+        return out.reshape(self.blocksize, -1)
+
+def render(scene_path, out_path, ref=1.0, speed=343.0, air=0.15, doppler=True,
+           blocksize=2048, control=32):
+    with open(scene_path) as f:
+        scene = json.load(f)
+    base = os.path.dirname(os.path.abspath(scene_path))
+    rate = scene.get("rate", 48000)
+    order = scene.get("order", 3)
+    norm = scene.get("norm", "N3D")
+    sources = scene["sources"]
+
+    readers = [WavReader(os.path.join(base, s["file"])) for s in sources]
+    for s, r in zip(sources, readers):
+        if r.rate != rate:
+            raise ValueError(f"{s['file']} is {r.rate} Hz, scene is {rate} Hz")
+    gains = np.array([float(s.get("gain", 1.0)) for s in sources], dtype=np.float32)[:, None]
+    renderer = DistanceRenderer(load_trajectories(sources, ref), rate, order, norm, ref,
+                                speed, air, doppler, blocksize, control)
+    blocksize = renderer.blocksize
+    tail = int(np.ceil(renderer.max_delay)) + 4 if doppler else 0
+    frames = max((r.frames for r in readers), default=0) + tail
+    log(f"{len(sources)} sources, {frames / rate:.1f}s, max delay {renderer.max_delay / rate * 1000:.0f} ms")
+
+    x = np.zeros((len(sources), blocksize), dtype=np.float32)
+    with open_output(out_path, (order + 1) ** 2, rate, order, norm) as writer:
+        for start in range(0, frames, blocksize):
+            x.fill(0.0)
+            for s, r in enumerate(readers):
+                block = r.read(blocksize)
+                x[s, :len(block)] = block[:, 0]
+            out = renderer.process(x * gains)
+            writer.write(out[:min(blocksize, frames - start)])
+    for r in readers:
+        r.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Render moving sources with distance gain, air absorption and Doppler.")
+    parser.add_argument("scene", help="Scene (JSON)")
+    parser.add_argument("outfile", help="B-format WAV (32-bit float) or '-' for a stream")
+    parser.add_argument("--ref", type=float, default=1.0)
+    parser.add_argument("--speed", type=float, default=343.0)
+    parser.add_argument("--air", type=float, default=0.15)
+    parser.add_argument("--no-doppler", action="store_true")
+    parser.add_argument("--blocksize", type=int, default=2048)
+    parser.add_argument("--control", type=int, default=32)
+    args = parser.parse_args()
+    if args.blocksize < args.control:
+        sys.exit("--blocksize must be at least --control")
+    try:
+        render(args.scene, args.outfile, args.ref, args.speed, args.air, not args.no_doppler,
+               args.blocksize, args.control)
+    except (ValueError, KeyError) as e:
+        sys.exit(f"{args.scene}: {e}")
+    if not is_stream(args.outfile):
+        print(f"Wrote {args.outfile}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except BrokenPipeError:
+        # downstream stage exited early (e.g. `| head`)
+        sys.stderr.close()
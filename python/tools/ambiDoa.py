@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import numpy as np
+
+from ambiSH import sh_n3d, acn_degree, maxre_weights
+from ambiPipe import open_input, stream_order, log
+
+"""
+Streaming Direction-of-Arrival Analysis
+---------------------------------------
+Checks where sources land in a B-format recording (e.g. ambiNilla3 output
+captured with writesf~). A streaming STFT of W/Y/Z/X gives, per
+time-frequency bin, the active intensity vector Re{W* [X Y Z]} (its
+direction is the DOA) and the diffuseness 1 - |<I>| / <E>. Optionally a
+steered power map is evaluated over a direction grid with all SH channels:
+one covariance matrix per STFT frame, then P(dir) = y(dir)^T R y(dir) for the
+whole grid as a single batched product.
+
+Frames are processed a chunk at a time from a fixed overlap buffer, so memory
+is constant. Output is downsampled: one track point per --track seconds and
+one azimuth/elevation histogram (and power map) per --segment seconds.
+
+Angles are degrees. Azimuth: 0 = front; 90 = left; 180 = rear; 270 = right
+(ambiNilla3's 0-2pi). Elevation: 0 = horizontal; 90 = zenith.
+
+USAGE:
+    python ambiDoa.py rec.wav --out doa.npz
+    python ambiDoa.py rec.wav --out doa.npz --map --grid 5 --segment 1.0
+    ... | python ambiDoa.py - --out doa.npz --norm SN3D
+"""
+
+def grid_directions(step):
+    """Azimuth/elevation grid in radians, (num, 2), step in degrees."""
+    az = np.radians(np.arange(0.0, 360.0, step))
+    el = np.radians(np.arange(-90.0, 90.0 + step / 2, step))
+    A, E = np.meshgrid(az, el, indexing="ij")
+    return np.stack([A.ravel(), E.ravel()], axis=1)
+
+class DoaAnalyzer:
+    def __init__(self, rate, order, norm="N3D", fft=1024, hop=512, fmin=100.0, fmax=8000.0,
+                 track=0.1, segment=1.0, bins=(72, 36), smooth=8, map_step=None):
+        self.rate = rate
+        self.fft = fft
+        self.hop = hop
+        self.window = np.hanning(fft + 1)[:-1].astype(np.float32)
+        freqs = np.fft.rfftfreq(fft, 1.0 / rate)
+        self.band = (freqs >= fmin) & (freqs <= fmax)
+        self.order = order
+        self.nch = (order + 1) ** 2
+        # everything below runs in N3D; first order scaled to velocity units
+        self.to_n3d = np.ones(self.nch) if norm.upper() == "N3D" \
+            else np.sqrt(2.0 * acn_degree(order) + 1.0)
+        self.buffer = np.zeros((0, self.nch), dtype=np.float32)
+        self.frames_done = 0
+        self.alpha = 1.0 / smooth
+        self.I_avg = np.zeros((int(self.band.sum()), 3))
+        self.E_avg = np.zeros(int(self.band.sum()))
+        self.track_frames = max(1, int(round(track * rate / hop)))
+        self.segment_frames = max(1, int(round(segment * rate / hop)))
+        self.bins = bins
+        self.tracks = []
+        self.track_acc = [np.zeros(3), 0.0, 0.0, 0]   # I sum, E sum, diffuseness*E sum, frames
+        self.hists = []
+        self.hist = np.zeros(bins)
+        self.seg_count = 0
+        self.map_step = map_step
+        if map_step:
+            self.grid = grid_directions(map_step)
+            g = maxre_weights(order)[acn_degree(order)]
+            self.Yg = sh_n3d(order, self.grid[:, 0], self.grid[:, 1]) * g
+            self.maps = []
+            self.R = np.zeros((self.nch, self.nch))
+
+    def process(self, block):
+        self.buffer = np.concatenate([self.buffer, block[:, :self.nch]])
+        count = (len(self.buffer) - self.fft) // self.hop + 1
+        if count <= 0:
+            return
+        frames = np.lib.stride_tricks.sliding_window_view(self.buffer, self.fft, axis=0)
+        frames = frames[:count * self.hop:self.hop]            # (count, ch, fft)
+        spec = np.fft.rfft(frames * self.window, axis=2)[:, :, self.band]
+        spec *= self.to_n3d[None, :, None]
+        self.buffer = self.buffer[count * self.hop:]
+        self._analyse(spec)
+
+    def _analyse(self, spec):
+        W = spec[:, 0]
+        V = spec[:, [3, 1, 2]] / np.sqrt(3.0)                     # X, Y, Z -> velocity
+        I = np.real(np.conj(W)[:, None] * V).transpose(0, 2, 1)  # (frames, bins, 3)
+        E = 0.5 * (np.abs(W) ** 2 + np.sum(np.abs(V) ** 2, axis=1))
+        if self.map_step:
+            # per-frame SH covariance, summed over the band
+            R = np.real(np.einsum("fib,fjb->fij", spec, np.conj(spec), optimize=True))
+
+        for f in range(spec.shape[0]):
+            # recursive smoothing for diffuseness, vectorized over bins
+            self.I_avg += self.alpha * (I[f] - self.I_avg)
+            self.E_avg += self.alpha * (E[f] - self.E_avg)
+            psi = 1.0 - np.linalg.norm(self.I_avg, axis=1) / np.maximum(self.E_avg, 1e-20)
+            psi = np.clip(psi, 0.0, 1.0)
+
+            acc = self.track_acc
+            acc[0] += I[f].sum(axis=0)
+            acc[1] += E[f].sum()
+            acc[2] += (psi * E[f]).sum()
+            acc[3] += 1
+            az = np.degrees(np.arctan2(I[f, :, 1], I[f, :, 0])) % 360.0
+            el = np.degrees(np.arctan2(I[f, :, 2], np.hypot(I[f, :, 0], I[f, :, 1])))
+            h, _, _ = np.histogram2d(az, el, bins=self.bins, range=[[0, 360], [-90, 90]],
+                                     weights=E[f] * (1.0 - psi))
+            self.hist += h
+            if self.map_step:
+                self.R += R[f]
+            self.seg_count += 1
+            self.frames_done += 1
+
+            if acc[3] == self.track_frames:
+                self._flush_track()
+            if self.seg_count == self.segment_frames:
+                self._flush_segment()
+
+    def _flush_track(self):
+        I_sum, E_sum, psiE, n = self.track_acc
+        if n == 0:
+            return
+        t = (self.frames_done - n) * self.hop / self.rate
+        az = np.degrees(np.arctan2(I_sum[1], I_sum[0])) % 360.0
+        el = np.degrees(np.arctan2(I_sum[2], np.hypot(I_sum[0], I_sum[1])))
+        psi = psiE / E_sum if E_sum > 0 else 1.0
+        self.tracks.append([t, az, el, psi, E_sum / n])
+        self.track_acc = [np.zeros(3), 0.0, 0.0, 0]
+
+    def _flush_segment(self):
+        if self.seg_count == 0:
+            return
+        self.hists.append(self.hist)
+        self.hist = np.zeros(self.bins)
+        if self.map_step:
+            self.maps.append(np.einsum("gi,ij,gj->g", self.Yg, self.R, self.Yg, optimize=True))
+            self.R = np.zeros((self.nch, self.nch))
+        self.seg_count = 0
+
+    def result(self):
+        self._flush_track()
+        self._flush_segment()
+        tracks = np.array(self.tracks).reshape(-1, 5)
+        seg = self.segment_frames * self.hop / self.rate
+        out = {
+            "track_time": tracks[:, 0], "track_azi": tracks[:, 1], "track_ele": tracks[:, 2],
+            "track_diffuseness": tracks[:, 3], "track_energy": tracks[:, 4],
+            "hist_time": np.arange(len(self.hists)) * seg,
+            "hist": np.array(self.hists).reshape(-1, *self.bins),
+            "hist_azi_edges": np.linspace(0, 360, self.bins[0] + 1),
+            "hist_ele_edges": np.linspace(-90, 90, self.bins[1] + 1),
+        }
+        if self.map_step:
+            out["map"] = np.array(self.maps).reshape(-1, len(self.grid))
+            out["map_dirs"] = np.degrees(self.grid)
+        return out
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming intensity DOA / diffuseness analysis.")
+    parser.add_argument("infile", help="B-format WAV (ACN) or '-' for a stream")
+    parser.add_argument("--out", help="Result file (.npz)")
+    parser.add_argument("--norm", choices=["N3D", "SN3D"],
+                        help="Input normalization (default: stream header, else N3D)")
+    parser.add_argument("--order", type=int, help="Order for the power map (default: all channels)")
+    parser.add_argument("--fft", type=int, default=1024)
+    parser.add_argument("--fmin", type=float, default=100.0)
+    parser.add_argument("--fmax", type=float, default=8000.0)
+    parser.add_argument("--track", type=float, default=0.1, help="Track resolution in seconds")
+    parser.add_argument("--segment", type=float, default=1.0, help="Histogram/map resolution in seconds")
+    parser.add_argument("--map", action="store_true", help="Also compute steered power maps")
+    parser.add_argument("--grid", type=float, default=5.0, help="Power map grid step in degrees")
+    args = parser.parse_args()
+
+    with open_input(args.infile) as reader:
+        order = stream_order(reader) if args.order is None else args.order
+        if order < 1:
+            sys.exit(f"{args.infile}: need at least first-order B-format")
+        norm = args.norm or getattr(reader, "norm", None) or "N3D"
+        doa = DoaAnalyzer(reader.rate, order, norm, args.fft, args.fft // 2, args.fmin, args.fmax,
+                          args.track, args.segment, map_step=args.grid if args.map else None)
+        for block in reader.blocks(args.fft * 8):
+            doa.process(block)
+    res = doa.result()
+
+    if args.out:
+        np.savez_compressed(args.out, **res)
+    E = res["track_energy"]
+    if len(E) and E.sum() > 0:
+        # energy-weighted mean direction over the whole file
+        x = np.sum(E * np.cos(np.radians(res["track_ele"])) * np.cos(np.radians(res["track_azi"])))
+        y = np.sum(E * np.cos(np.radians(res["track_ele"])) * np.sin(np.radians(res["track_azi"])))
+        z = np.sum(E * np.sin(np.radians(res["track_ele"])))
+        log(f"{len(E)} track points; mean direction azi {np.degrees(np.arctan2(y, x)) % 360:.1f} "
+            f"ele {np.degrees(np.arctan2(z, np.hypot(x, y))):.1f}, "
+            f"diffuseness {np.average(res['track_diffuseness'], weights=E):.2f}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except BrokenPipeError:
+        # downstream stage exited early (e.g. `| head`)
+        sys.stderr.close()
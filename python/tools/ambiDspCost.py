@@ -0,0 +1,505 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import json
+import argparse
+from collections import defaultdict
+
+"""
+Static DSP-Cost Analyzer for the Pd Patches
+-------------------------------------------
+Predicts what a scene costs before loading it. Parses main.pd and the
+abstractions in 'abstractions', expands every abstraction with its creation
+arguments, then runs the control messages that matter at load time
+(loadbang chains, [r ambiOrder], [r chanConfig], ...) through a small message
+interpreter to find which switch~ canvases end up on. block~/switch~
+arguments (blocksize, overlap, up/downsampling, e.g. the 'block~ 64 1 0.125'
+math subpatches of ambiNilla3~) scale each canvas's sample rate.
+
+For the active canvases it counts signal objects, multiplies per 64-sample
+DSP block and a weighted operation count, and turns that into an estimated
+CPU load. The scene estimate replaces the encoders in main.pd with
+--sources instances of --encoder, set up with the ambiOrder/chanConfig/ambiNorm
+values main.pd sent (or the command-line overrides).
+
+The op weights below are rough per-sample costs of Pd's C loops; scale
+--ops-per-sec to a machine once (load a known patch, read Pd's CPU meter) and
+the relative numbers carry over.
+
+USAGE:
+    python ambiDspCost.py --order 3 --chans 16 --sources 64
+    python ambiDspCost.py --order 1 --chans 4 --sources 8 --encoder ambiNilla3 --json
+    python ambiDspCost.py --patch ../../abstractions/ambiSpeaker.pd --args 1000 5 --chans 8
+"""
+
+# class: (multiplies per sample, weighted ops per sample)
+SIGNAL_COST = {
+    "*~": (1, 1), "+~": (0, 1), "-~": (0, 1), "/~": (0, 4),
+    "cos~": (1, 4), "osc~": (1, 5), "phasor~": (0, 2), "pow~": (0, 20),
+    "sqrt~": (0, 6), "rsqrt~": (0, 6), "abs~": (0, 1), "clip~": (0, 2), "wrap~": (0, 2),
+    "line~": (0, 1), "vline~": (0, 3), "noise~": (1, 3), "sig~": (0, 0),
+    "biquad~": (5, 9), "lop~": (2, 3), "hip~": (2, 3), "bp~": (3, 5), "vcf~": (6, 12),
+    "env~": (2, 3), "slop~": (4, 10), "snapshot~": (0, 0),
+    "throw~": (0, 1), "catch~": (0, 1), "s~": (0, 1), "r~": (0, 1),
+    "inlet~": (0, 0), "outlet~": (0, 0), "dac~": (0, 1), "adc~": (0, 1),
+    "writesf~": (0, 2), "readsf~": (0, 2), "expr~": (1, 10),
+    "tabread~": (0, 2), "tabread4~": (3, 8), "tabplay~": (0, 1), "delwrite~": (0, 1),
+    "delread~": (0, 2), "delread4~": (3, 8), "vd~": (3, 8),
+}
+UNKNOWN_SIGNAL_COST = (0, 2)
+OBJECT_OVERHEAD = 30          # ops per object per DSP call (scheduler, pointer setup)
+NO_DSP = {"switch~", "block~"}
+GUI_PASSTHROUGH = {"floatatom", "nbx", "hsl", "vsl", "hradio", "vradio", "tgl", "listbox"}
+BINOPS = {
+    "+": lambda a, b: a + b, "-": lambda a, b: a - b, "*": lambda a, b: a * b,
+    "/": lambda a, b: a / b if b else 0.0, ">=": lambda a, b: float(a >= b),
+    ">": lambda a, b: float(a > b), "<": lambda a, b: float(a < b),
+    "<=": lambda a, b: float(a <= b), "==": lambda a, b: float(a == b),
+    "!=": lambda a, b: float(a != b), "&&": lambda a, b: float(bool(a) and bool(b)),
+    "||": lambda a, b: float(bool(a) or bool(b)), "max": max, "min": min,
+}
+BANG = ("bang",)
+MAX_DEPTH = 400
+GLOBALS = ("ambiOrder", "chanConfig", "ambiNorm")
+
+def atom(tok):
+    try:
+        return float(tok)
+    except ValueError:
+        return tok
+
+def is_number(tok):
+    return isinstance(atom(tok), float)
+
+class Node:
+    def __init__(self, canvas, kind, x, cls, args):
+        self.canvas = canvas
+        self.kind = kind              # obj, msg, floatatom, text, ...
+        self.x = x
+        self.cls = cls
+        self.args = args
+        self.sub = None               # Canvas for subpatches and abstractions
+        self.state = {}
+
+class Canvas:
+    def __init__(self, parent, label):
+        self.parent = parent
+        self.label = label
+        self.nodes = []
+        self.edges = defaultdict(list)
+        self.container = None
+        self.abstraction = False      # loaded from a file (vs. a [pd] subpatch)
+        self.switch = None            # switch~ node, if any
+        self.switch_on = False        # switch~ starts off until it receives nonzero
+        self.dsp_args = None          # (blocksize, overlap, updown) from block~/switch~
+
+    def ports(self, name):
+        return sorted((n for n in self.nodes if n.cls == name or n.cls == name + "~"),
+                      key=lambda n: n.x)
+
+    def path(self):
+        return self.label if self.parent is None else self.parent.path() + " / " + self.label
+
+class Patch:
+    """A loaded patch tree plus the message interpreter used to resolve gating."""
+
+    def __init__(self, path, args=(), search=()):
+        self.search = [os.path.dirname(os.path.abspath(path))] + list(search)
+        self.receivers = defaultdict(list)
+        self.sent = {}                # last float sent to each of GLOBALS
+        self.instance = 1000
+        self.root = self._load(path, list(args), None, os.path.splitext(os.path.basename(path))[0])
+
+    # --- parsing ---
+
+    def _find(self, cls):
+        for d in self.search:
+            p = os.path.join(d, cls + ".pd")
+            if os.path.isfile(p):
+                return p
+        return None
+
+    def _load(self, path, args, parent, label, depth=0):
+        if depth > 32:
+            raise RecursionError(f"abstraction nesting too deep at {path}")
+        with open(path) as f:
+            text = f.read()
+        self.instance += 1
+        dollar0 = str(self.instance)
+        stack = []
+        canvas = None
+        top = None
+        for rec in re.split(r"(?<!\\);\s*\n", text):
+            tokens = rec.split()
+            if len(tokens) < 2:
+                continue
+            if tokens[0] == "#N" and tokens[1] == "canvas":
+                sub = Canvas(canvas if canvas else parent, label if canvas is None else "?")
+                if canvas is not None:
+                    stack.append(canvas)
+                else:
+                    top = sub
+                canvas = sub
+                continue
+            if tokens[0] != "#X" or canvas is None:
+                continue
+            kind = tokens[1]
+            if kind == "restore":
+                inner = canvas
+                canvas = stack.pop()
+                name = " ".join(tokens[4:])
+                inner.label = name
+                node = Node(canvas, "obj", float(tokens[2]), tokens[4] if len(tokens) > 4 else "", tokens[5:])
+                node.sub = inner
+                inner.container = node
+                canvas.nodes.append(node)
+            elif kind in ("obj", "msg", "floatatom", "symbolatom", "listbox", "text", "array"):
+                body = tokens[4:] if kind in ("obj", "msg", "text") else tokens[2:]
+                if len(body) >= 3 and body[-2] == "f" and body[-3].endswith(",") \
+                        and not body[-3].endswith("\\,"):
+                    body = body[:-2]
+                    body[-1] = body[-1][:-1]
+                    if not body[-1]:
+                        body = body[:-1]
+                x = float(tokens[2]) if kind != "array" else 0.0
+                if kind == "obj":
+                    body = [self._subst(t, args, dollar0) for t in body]
+                    cls = body[0] if body else ""
+                    node = Node(canvas, kind, x, cls, body[1:])
+                    self._attach(node, args, depth)
+                else:
+                    node = Node(canvas, kind, x, kind, body)
+                canvas.nodes.append(node)
+            elif kind == "connect":
+                a, o, b, i = (int(t) for t in tokens[2:6])
+                canvas.edges[(a, o)].append((b, i))
+        return top
+
+    def _subst(self, tok, args, dollar0):
+        def rep(m):
+            n = int(m.group(1))
+            if n == 0:
+                return dollar0
+            return args[n - 1] if n <= len(args) else "0"
+        return re.sub(r"\\?\$(\d+)", rep, tok)
+
+    def _attach(self, node, args, depth):
+        cls = node.cls
+        if cls in ("r", "receive") and node.args:
+            self.receivers[node.args[0]].append(node)
+        elif cls in NO_DSP:
+            if cls == "switch~":
+                node.canvas.switch = node
+            nums = [float(a) for a in node.args if is_number(a)]
+            if nums:
+                node.canvas.dsp_args = (nums + [1.0, 1.0])[:3]
+        elif cls and not is_number(cls):
+            path = self._find(cls)
+            if path:
+                node.sub = self._load(path, node.args, node.canvas,
+                                      " ".join([cls] + node.args), depth + 1)
+                node.sub.container = node
+                node.sub.abstraction = True
+
+    # --- message interpreter ---
+
+    def run(self, globals_):
+        self._loadbang(self.root)
+        for name, value in globals_.items():
+            self.broadcast(name, (float(value),), 0)
+
+    # Pd's order (canvas_loadbang): every abstraction first, each one loadbanged
+    # the same way, then subpatches depth-first, then the canvas's own objects
+
+    def _loadbang(self, canvas):
+        self._loadbang_abstractions(canvas)
+        self._loadbang_subpatches(canvas)
+
+    def _loadbang_abstractions(self, canvas):
+        for node in canvas.nodes:
+            if node.sub is not None:
+                if node.sub.abstraction:
+                    self._loadbang(node.sub)
+                else:
+                    self._loadbang_abstractions(node.sub)
+
+    def _loadbang_subpatches(self, canvas):
+        for node in canvas.nodes:
+            if node.sub is not None and not node.sub.abstraction:
+                self._loadbang_subpatches(node.sub)
+        for node in canvas.nodes:
+            if node.sub is None and node.cls == "loadbang":
+                self.output(node, 0, BANG, 0)
+
+    def broadcast(self, name, msg, depth):
+        if name in GLOBALS and isinstance(msg[0], float):
+            self.sent[name] = msg[0]
+        for r in self.receivers.get(name, []):
+            self.output(r, 0, msg, depth + 1)
+
+    def output(self, node, outlet, msg, depth):
+        if depth > MAX_DEPTH:
+            return
+        canvas = node.canvas
+        idx = canvas.nodes.index(node)
+        for b, i in list(canvas.edges.get((idx, outlet), [])):
+            self.receive(canvas.nodes[b], i, msg, depth + 1)
+
+    def receive(self, node, inlet, msg, depth):
+        cls, st = node.cls, node.state
+        first = msg[0]
+        if node.sub is not None:
+            ports = node.sub.ports("inlet")
+            if inlet < len(ports):
+                self.output(ports[inlet], 0, msg, depth)
+            return
+        if cls == "outlet":
+            container = node.canvas.container
+            if container is not None:
+                self.output(container, container.sub.ports("outlet").index(node), msg, depth)
+            return
+        if node.kind == "msg":
+            self._message(node, msg, depth)
+            return
+        if cls in ("s", "send") and node.args and inlet == 0:
+            self.broadcast(node.args[0], msg, depth)
+        elif cls in ("switch~", "block~") and inlet == 0 and isinstance(first, float):
+            node.canvas.switch_on = first != 0.0
+        elif cls in ("t", "trigger"):
+            for k in range(len(node.args) - 1, -1, -1):
+                self.output(node, k, BANG if node.args[k] in ("b", "bang") else msg, depth)
+        elif cls in ("f", "float", "i", "int") or is_number(cls):
+            if "v" not in st:
+                st["v"] = atom(cls) if is_number(cls) else (atom(node.args[0]) if node.args else 0.0)
+            if inlet == 1 and isinstance(first, float):
+                st["v"] = first
+            elif inlet == 0:
+                if isinstance(first, float):
+                    st["v"] = first
+                self.output(node, 0, (st["v"],), depth)
+        elif cls in BINOPS:
+            if "r" not in st:
+                st["r"] = atom(node.args[0]) if node.args and is_number(node.args[0]) else 0.0
+            if inlet == 1 and isinstance(first, float):
+                st["r"] = first
+            elif inlet == 0:
+                if isinstance(first, float):
+                    st["l"] = first
+                self.output(node, 0, (BINOPS[cls](st.get("l", 0.0), st["r"]),), depth)
+        elif cls in ("sel", "select") and inlet == 0:
+            for k, a in enumerate(node.args):
+                if atom(a) == first:
+                    self.output(node, k, BANG, depth)
+                    return
+            self.output(node, len(node.args), msg, depth)
+        elif cls == "moses" and inlet == 0 and isinstance(first, float):
+            split = atom(node.args[0]) if node.args else 0.0
+            self.output(node, 0 if first < split else 1, msg, depth)
+        elif cls == "spigot":
+            if inlet == 1:
+                st["open"] = first
+            elif st.get("open", atom(node.args[0]) if node.args else 0.0):
+                self.output(node, 0, msg, depth)
+        elif cls in ("del", "delay") and inlet == 0:
+            self.output(node, 0, BANG, depth)
+        elif cls in GUI_PASSTHROUGH or node.kind in ("floatatom", "listbox"):
+            if isinstance(first, float):
+                st["v"] = first
+            elif "v" not in st:
+                st["v"] = atom(node.args[-1]) if cls in ("hradio", "vradio", "tgl") and node.args else 0.0
+            self.output(node, 0, (st["v"],), depth)
+        elif cls == "bng":
+            self.output(node, 0, BANG, depth)
+
+    def _message(self, node, msg, depth):
+        incoming = [a for a in msg if a != "bang"]
+        tokens = []
+        for t in node.args:
+            m = re.fullmatch(r"\\?\$(\d+)", t)
+            if m:
+                n = int(m.group(1))
+                tokens.append(str(incoming[n - 1]) if 0 < n <= len(incoming) else "0")
+            else:
+                tokens.append(t)
+        segments, cur = [], []
+        for t in tokens:
+            if t == "\\;":
+                segments.append(cur)
+                cur = []
+            else:
+                cur.append(t)
+        segments.append(cur)
+        if segments[0]:
+            self.output(node, 0, tuple(atom(t) for t in segments[0]), depth)
+        for seg in segments[1:]:
+            if len(seg) >= 2:
+                self.broadcast(seg[0], tuple(atom(t) for t in seg[1:]), depth)
+
+    # --- cost ---
+
+    def cost(self, rate=48000.0, block=64):
+        """Per-canvas cost for the current switch state, as a list of dicts."""
+        result = []
+        self._cost(self.root, True, 1.0, float(block), block, rate, result)
+        return result
+
+    def _cost(self, canvas, active, factor, blocksize, top_block, rate, out):
+        if canvas.switch is not None:
+            active = active and canvas.switch_on
+        if canvas.dsp_args:
+            blocksize = canvas.dsp_args[0] or blocksize
+            factor *= canvas.dsp_args[1] * canvas.dsp_args[2]
+        samples = top_block * factor                # samples processed per top-level block
+        calls = samples / blocksize
+        entry = {"canvas": canvas, "path": canvas.path(), "active": active, "objects": 0, "mults": 0.0, "ops": 0.0,
+                 "classes": defaultdict(int)}
+        for node in canvas.nodes:
+            if node.sub is not None:
+                self._cost(node.sub, active, factor, blocksize, top_block, rate, out)
+                continue
+            if node.kind != "obj" or not node.cls.endswith("~") or node.cls in NO_DSP:
+                continue
+            if not active:
+                continue
+            mults, ops = SIGNAL_COST.get(node.cls, UNKNOWN_SIGNAL_COST)
+            entry["objects"] += 1
+            entry["mults"] += mults * samples
+            entry["ops"] += ops * samples + OBJECT_OVERHEAD * calls
+            entry["classes"][node.cls] += 1
+        out.append(entry)
+
+def summarize(entries, rate, block, ops_per_sec):
+    objects = sum(e["objects"] for e in entries)
+    mults = sum(e["mults"] for e in entries)
+    ops = sum(e["ops"] for e in entries)
+    classes = defaultdict(int)
+    for e in entries:
+        for c, n in e["classes"].items():
+            classes[c] += n
+    ops_s = ops * rate / block
+    return {"signal_objects": objects, "mults_per_block": mults, "ops_per_block": ops,
+            "ops_per_sec": ops_s, "cpu_percent": 100.0 * ops_s / ops_per_sec,
+            "classes": dict(sorted(classes.items(), key=lambda kv: -kv[1]))}
+
+def ancestors(canvas):
+    while canvas is not None:
+        yield canvas
+        canvas = canvas.parent
+
+def subtree(entries, root):
+    return [e for e in entries if root in ancestors(e["canvas"])]
+
+def in_encoder(canvas):
+    return any(c.container is not None and c.container.cls in ("ambiNilla3", "ambiNilla3~")
+               for c in ancestors(canvas))
+
+def encoder_instances(canvas, cls):
+    """Top-level instances of abstraction `cls` in the tree, outermost first."""
+    for node in canvas.nodes:
+        if node.sub is None:
+            continue
+        if node.cls == cls:
+            yield node.sub
+        else:
+            yield from encoder_instances(node.sub, cls)
+
+def main():
+    here = os.path.dirname(os.path.abspath(__file__))
+    repo = os.path.normpath(os.path.join(here, "..", ".."))
+    parser = argparse.ArgumentParser(description="Static DSP-cost estimate for the ambiNilla Pd patches.")
+    parser.add_argument("--patch", default=os.path.join(repo, "main.pd"))
+    parser.add_argument("--args", nargs="*", default=[], help="Creation arguments for --patch")
+    parser.add_argument("--order", type=int, help="ambiOrder (default: what the patch loadbangs)")
+    parser.add_argument("--chans", type=int, help="chanConfig (2, 4, 8 or 16)")
+    parser.add_argument("--norm", type=int, choices=[0, 1], help="ambiNorm (0 = N3D, 1 = SN3D)")
+    parser.add_argument("--sources", type=int, help="Scene: number of encoders")
+    parser.add_argument("--encoder", default="ambiNilla3~", choices=["ambiNilla3~", "ambiNilla3"])
+    parser.add_argument("--rate", type=float, default=48000.0)
+    parser.add_argument("--ops-per-sec", type=float, default=1e9,
+                        help="Machine capacity in weighted ops/s (calibration, default 1e9)")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    search = [os.path.join(repo, "abstractions")]
+    globals_ = {}
+    if args.order is not None:
+        globals_["ambiOrder"] = args.order
+    if args.chans is not None:
+        globals_["chanConfig"] = args.chans
+    if args.norm is not None:
+        globals_["ambiNorm"] = args.norm
+
+    patch = Patch(args.patch, args.args, search)
+    patch.run(globals_)
+    entries = patch.cost(args.rate)
+    report = {"patch": os.path.basename(args.patch), "settings": {**patch.sent, **globals_},
+              "total": summarize(entries, args.rate, 64, args.ops_per_sec), "instances": {}}
+
+    # the settings reported must be the ones costed: sending them explicitly
+    # has to give the same result (fails if load order matters somewhere)
+    if report["settings"] != globals_:
+        again = Patch(args.patch, args.args, search)
+        again.run(report["settings"])
+        check = summarize(again.cost(args.rate), args.rate, 64, args.ops_per_sec)
+        if check["ops_per_block"] != report["total"]["ops_per_block"]:
+            print(f"warning: {report['settings']} sent explicitly gives {check['signal_objects']} active "
+                  f"objects, the default run {report['total']['signal_objects']}", file=sys.stderr)
+
+    # breakdown per direct child of the root (subpatches and abstractions)
+    for node in patch.root.nodes:
+        if node.sub is not None:
+            s = summarize(subtree(entries, node.sub), args.rate, 64, args.ops_per_sec)
+            if s["signal_objects"]:
+                label = node.sub.label
+                while label in report["instances"]:
+                    label += "'"
+                report["instances"][label] = s
+
+    if args.sources is not None:
+        # the standalone encoder hears no loadbang from main.pd: replay what
+        # main.pd sent to the global receivers, CLI settings on top
+        enc = Patch(os.path.join(search[0], args.encoder + ".pd"), [], search)
+        enc.run({**patch.sent, **globals_})
+        per_source = summarize(enc.cost(args.rate), args.rate, 64, args.ops_per_sec)
+        for inst in encoder_instances(patch.root, args.encoder):
+            # same settings, so it must cost what main.pd's own instance costs
+            own = summarize(subtree(entries, inst), args.rate, 64, args.ops_per_sec)
+            if own["signal_objects"] != per_source["signal_objects"]:
+                print(f"warning: standalone {args.encoder} has {per_source['signal_objects']} active "
+                      f"objects, the instance in {report['patch']} {own['signal_objects']}",
+                      file=sys.stderr)
+            break
+        base = summarize([e for e in entries if not in_encoder(e["canvas"])],
+                         args.rate, 64, args.ops_per_sec)
+        report["scene"] = {
+            "sources": args.sources, "encoder": args.encoder, "per_source": per_source,
+            "signal_objects": base["signal_objects"] + args.sources * per_source["signal_objects"],
+            "mults_per_block": base["mults_per_block"] + args.sources * per_source["mults_per_block"],
+            "cpu_percent": base["cpu_percent"] + args.sources * per_source["cpu_percent"],
+        }
+
+    if args.json:
+        print(json.dumps(report, indent=1))
+        return
+    t = report["total"]
+    print(f"{report['patch']} {report['settings'] or '(no settings sent)'}")
+    print(f"  active signal objects {t['signal_objects']}, multiplies/block {t['mults_per_block']:.0f}, "
+          f"est. CPU {t['cpu_percent']:.1f}%")
+    for path, s in report["instances"].items():
+        print(f"    {path:50s} {s['signal_objects']:5d} obj {s['mults_per_block']:9.0f} mul/blk "
+              f"{s['cpu_percent']:6.2f}%")
+    if "scene" in report:
+        sc = report["scene"]
+        p = sc["per_source"]
+        print(f"  scene: {sc['sources']} x {sc['encoder']} ({p['signal_objects']} obj, "
+              f"{p['mults_per_block']:.0f} mul/blk, {p['cpu_percent']:.2f}% each)")
+        print(f"    total {sc['signal_objects']} signal objects, {sc['mults_per_block']:.0f} mul/blk, "
+              f"est. CPU {sc['cpu_percent']:.1f}% of one core"
+              + ("  -> does NOT fit" if sc["cpu_percent"] > 100 else ""))
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (OSError, RecursionError) as e:
+        sys.exit(str(e))
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+import sys
+import argparse
+import numpy as np
+
+from ambiSH import acn_degree
+from ambiPipe import open_input, stream_order, log
+
+"""
+Offline Multichannel Meter
+--------------------------
+The offline counterpart of the chanStrMMvu/vu meters in main.pd, for QC of
+rendered shows and raw ambisonic recordings. For every window it reports per
+channel RMS, sample peak and true peak (4x oversampled, as in ITU-R BS.1770),
+and for ambisonic input the energy of each SH order. All channels are
+processed in one vectorized pass, many windows per read; only the per-window
+results are kept, never the audio.
+
+Output: a compact time series (.npz, or .csv with one row per window) and a
+peak-hold summary on stderr.
+
+USAGE:
+    python ambiMeter.py show_VCCM.wav --window 0.1 --out meter.npz
+    python ambiMeter.py rec.wav --out meter.csv --order 3
+    ... | python ambiMeter.py - --out meter.npz
+
+FLAGS:
+    --window SEC   Window length in seconds (default 0.1, like env~ 1024 at 44.1k)
+    --order N      Treat the first (N+1)^2 channels as ACN ambisonics for
+                   per-order energy. Default: from the stream header or the
+                   channel count; -1 disables.
+    --floor DB     Lowest reported level (default -120)
+"""
+
+OVERSAMPLE = 4
+TAPS_PER_PHASE = 12
+
+def true_peak_filter():
+    """4-phase polyphase interpolator (48-tap Hann-windowed sinc), shape (phases, taps)."""
+    n = np.arange(OVERSAMPLE * TAPS_PER_PHASE) - (OVERSAMPLE * TAPS_PER_PHASE - 1) / 2.0
+    h = np.sinc(n / OVERSAMPLE) * np.hanning(len(n) + 2)[1:-1]
+    h = h.reshape(TAPS_PER_PHASE, OVERSAMPLE).T
+    return h / h.sum(axis=1, keepdims=True)
+
+def to_db(x, floor):
+    with np.errstate(divide="ignore"):
+        return np.maximum(20.0 * np.log10(x), floor)
+
+class Meter:
+    def __init__(self, channels, rate, window, order=-1, floor=-120.0):
+        self.channels = channels
+        self.rate = rate
+        self.window = window
+        self.floor = floor
+        self.h = true_peak_filter().astype(np.float32)
+        self.history = np.zeros((TAPS_PER_PHASE - 1, channels), dtype=np.float32)
+        self.order = order
+        if order >= 0:
+            degree = acn_degree(order)
+            self.order_matrix = (degree[:, None] == np.arange(order + 1)).astype(np.float32)
+        self.rows = []
+        self.frames = 0
+        self.hold_peak = np.zeros(channels, dtype=np.float32)
+        self.hold_true = np.zeros(channels, dtype=np.float32)
+        self.hold_time = np.zeros(channels)
+
+    def process(self, block):
+        """Meter a block of whole windows (the last one may be short)."""
+        n = block.shape[0]
+        # True peak: oversample with the polyphase filter, history carries across blocks
+        padded = np.concatenate([self.history, block])
+        upsampled = np.zeros(block.shape, dtype=np.float32)
+        acc = np.empty(block.shape, dtype=np.float32)
+        for phase in self.h:
+            acc.fill(0.0)
+            for k, tap in enumerate(phase[::-1]):
+                acc += tap * padded[k:k + n]
+            np.maximum(upsampled, np.abs(acc), out=upsampled)
+        self.history = padded[-(TAPS_PER_PHASE - 1):]
+
+        starts = np.arange(0, n, self.window)
+        counts = np.diff(np.append(starts, n))[:, None]
+        energy = self._per_window(block, lambda w: np.einsum("kwc,kwc->kc", w, w, dtype=np.float64))
+        peak = self._per_window(np.abs(block), lambda w: w.max(axis=1))
+        true = np.maximum(self._per_window(upsampled, lambda w: w.max(axis=1)), peak)
+        row = [self.frames + starts, np.sqrt(energy / counts), peak, true]
+        if self.order >= 0:
+            nch = self.order_matrix.shape[0]
+            row.append(np.sqrt(energy[:, :nch] @ self.order_matrix / counts))
+        self.rows.append(row)
+
+        for hold, level in ((self.hold_peak, peak), (self.hold_true, true)):
+            np.maximum(hold, level.max(axis=0), out=hold)
+        w = np.argmax(true, axis=0)
+        louder = true[w, np.arange(self.channels)] >= self.hold_true
+        self.hold_time[louder] = (self.frames + starts[w[louder]]) / self.rate
+        self.frames += n
+
+    def _per_window(self, x, reduce):
+        """Apply `reduce` to (windows, frames, channels) views; the last window may be short."""
+        full = x.shape[0] // self.window * self.window
+        out = [reduce(x[:full].reshape(-1, self.window, self.channels))]
+        if full < x.shape[0]:
+            out.append(reduce(x[None, full:]))
+        return np.concatenate(out)
+
+    def result(self):
+        cols = list(zip(*self.rows))
+        out = {
+            "time": np.concatenate(cols[0]) / self.rate,
+            "rms_db": to_db(np.concatenate(cols[1]), self.floor),
+            "peak_db": to_db(np.concatenate(cols[2]), self.floor),
+            "true_peak_db": to_db(np.concatenate(cols[3]), self.floor),
+            "hold_peak_db": to_db(self.hold_peak, self.floor),
+            "hold_true_peak_db": to_db(self.hold_true, self.floor),
+            "hold_true_peak_time": self.hold_time,
+        }
+        if self.order >= 0:
+            out["order_rms_db"] = to_db(np.concatenate(cols[4]), self.floor)
+        return out
+
+def write_csv(path, res):
+    channels = res["rms_db"].shape[1]
+    header = ["time"]
+    for key in ("rms", "peak", "true_peak"):
+        header += [f"{key}_{c + 1}" for c in range(channels)]
+    parts = [res["time"][:, None], res["rms_db"], res["peak_db"], res["true_peak_db"]]
+    if "order_rms_db" in res:
+        header += [f"order{l}_rms" for l in range(res["order_rms_db"].shape[1])]
+        parts.append(res["order_rms_db"])
+    np.savetxt(path, np.hstack(parts), delimiter=",", fmt="%.2f",
+               header=",".join(header), comments="")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline multichannel RMS/peak/true-peak/SH-order meter.")
+    parser.add_argument("infile", help="WAV file or '-' for a stream")
+    parser.add_argument("--out", help="Time series output (.npz or .csv)")
+    parser.add_argument("--window", type=float, default=0.1)
+    parser.add_argument("--order", type=int)
+    parser.add_argument("--floor", type=float, default=-120.0)
+    parser.add_argument("--windows-per-read", type=int, default=2)
+    args = parser.parse_args()
+
+    with open_input(args.infile) as reader:
+        order = stream_order(reader) if args.order is None else args.order
+        if (order + 1) ** 2 > reader.channels:
+            sys.exit(f"{reader.channels} channels are too few for order {order}")
+        window = max(1, int(round(args.window * reader.rate)))
+        meter = Meter(reader.channels, reader.rate, window, order, args.floor)
+        for block in reader.blocks(window * args.windows_per_read):
+            meter.process(block)
+    res = meter.result()
+
+    if args.out and args.out.endswith(".csv"):
+        write_csv(args.out, res)
+    elif args.out:
+        np.savez_compressed(args.out, **res)
+    log(f"{meter.frames} frames, {len(res['time'])} windows of {window} frames")
+    for c in range(reader.channels):
+        log(f"ch {c + 1:3d}: peak {res['hold_peak_db'][c]:7.2f} dBFS  "
+            f"true peak {res['hold_true_peak_db'][c]:7.2f} dBTP "
+            f"@ {res['hold_true_peak_time'][c]:.2f}s")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except BrokenPipeError:
+        # downstream stage exited early (e.g. `| head`)
+        sys.stderr.close()
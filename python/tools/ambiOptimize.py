@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+import numpy as np
+
+from ambiSH import LAYOUTS, sh, acn_degree, maxre_weights, build_decoder, write_list
+
+"""
+Decoder Optimizer (per-order weights + Tikhonov regularization)
+---------------------------------------------------------------
+The generators' pinv decoders are fine for regular layouts but badly behaved
+when the layout cannot carry the order (3OA on Stereo or Quad). This tool
+tunes, per layout, the per-order weights g_1..g_N (g_0 = 1) and a Tikhonov
+term mu of the decoder
+
+    D = (K K^T + lambda I)^-1 K diag(g_l),   lambda = mu * trace(K K^T) / speakers
+
+(K: SH at the speakers, (speakers, channels); mu = 0, g = 1 is the pinv
+decoder) to minimize, over a grid of panning directions u,
+
+    mean(1 - rE . u)  +  beta * mean((E / mean(E) - 1)^2)
+
+i.e. energy-vector (rE) length/direction error plus energy flatness. The
+objective and its analytic gradient are evaluated for a batch of starting
+points at once (basic, max-rE and in between, several mu), as stacked
+matrix products and solves, with Adam steps on all starts in parallel;
+a 64-speaker 5OA layout converges in seconds.
+
+The weights are kept in [0, --max-weight] (default 8) and mu in
+[1e-9, --max-mu] (default 1e3), loose enough that the Quad and Stereo optima
+are interior; a result on an upper bound prints a warning. g_l = 0 is a
+valid result and switches order l off.
+
+Where the layout cannot localize at all the energy term dominates. On Stereo
+everything behind the listener folds to the front, so rE direction barely
+responds to the parameters while the energy spread does: the optimizer
+flattens loudness (pinv -43..+5 dB, optimized about +-1 dB) and the mean rE
+angle error ends up some 8-13 degrees worse than pinv or max-rE. Lower --beta
+to weigh direction more (--beta 0.1: 56 deg mean, but pinv-like loudness).
+
+The grid is a Fibonacci sphere restricted to the elevations the layout
+covers (+-20 deg beyond its lowest/highest speaker), or a horizontal ring for
+horizontal layouts. The result is scaled to the mean grid energy of the pinv
+decoder and written as a standard 'ambiCoefficients' list.
+
+USAGE:
+    python ambiOptimize.py --layout Quad --order 3 --norm N3D
+        -> 3OA_Quad_N3D_Opt.txt
+    python ambiOptimize.py --speakers dome.txt --order 5 --out 5OA_Dome_SN3D.txt
+        (one 'azimuth elevation' pair in degrees per line)
+    python ambiOptimize.py --fibonacci 64 --order 5
+"""
+
+def fibonacci_directions(n):
+    """n near-uniform directions on the sphere, (n, 2) azimuth/elevation in radians."""
+    i = np.arange(n) + 0.5
+    ele = np.arcsin(1.0 - 2.0 * i / n)
+    azi = (i * np.pi * (3.0 - np.sqrt(5.0))) % (2.0 * np.pi)
+    return np.stack([azi, ele], axis=1)
+
+def unit_vectors(dirs):
+    azi, ele = dirs[:, 0], dirs[:, 1]
+    return np.stack([np.cos(ele) * np.cos(azi), np.cos(ele) * np.sin(azi), np.sin(ele)], axis=1)
+
+def panning_grid(speakers, points=1200):
+    """Evaluation directions covering the layout, (points, 2) radians."""
+    ele = speakers[:, 1]
+    if np.allclose(ele, 0.0):
+        azi = np.linspace(0.0, 2.0 * np.pi, 360, endpoint=False)
+        return np.stack([azi, np.zeros_like(azi)], axis=1)
+    lo = max(ele.min() - np.radians(20), -np.pi / 2)
+    hi = min(ele.max() + np.radians(20), np.pi / 2)
+    # spread `points` over the covered zone only
+    fraction = (np.sin(hi) - np.sin(lo)) / 2.0
+    grid = fibonacci_directions(int(points / fraction))
+    return grid[(grid[:, 1] >= lo) & (grid[:, 1] <= hi)]
+
+class DecoderObjective:
+    """Loss and gradient for a batch of (g_1..g_N, log mu) parameter vectors."""
+
+    def __init__(self, speakers, order, norm="N3D", grid=None, beta=1.0):
+        self.order = order
+        self.K = sh(order, speakers[:, 0], speakers[:, 1], norm)         # (L, C)
+        self.KK = self.K @ self.K.T
+        self.scale = np.trace(self.KK) / len(speakers)
+        self.S = unit_vectors(speakers)                                   # (L, 3)
+        grid = panning_grid(speakers) if grid is None else grid
+        self.Y = sh(order, grid[:, 0], grid[:, 1], norm)                   # (J, C)
+        self.U = unit_vectors(grid)                                       # (J, 3)
+        self.degree = acn_degree(order)
+        self.beta = beta
+
+    def decoders(self, params):
+        """(B, L, C) decoders and the (B, L, L) regularized Gram matrices."""
+        g = np.concatenate([np.ones((len(params), 1)), params[:, :-1]], axis=1)
+        lam = np.exp(params[:, -1]) * self.scale
+        A = self.KK + lam[:, None, None] * np.eye(len(self.KK))
+        D = np.linalg.solve(A, np.broadcast_to(self.K, (len(params),) + self.K.shape))
+        return D, D * g[:, None, self.degree], A, g, lam
+
+    def metrics(self, Dw):
+        """Gains (B, J, L), energy (B, J) and rE vectors (B, J, 3) on the grid."""
+        G = np.matmul(self.Y, Dw.transpose(0, 2, 1))
+        G2 = G * G
+        E = G2.sum(axis=2)
+        rE = np.matmul(G2, self.S) / E[:, :, None]
+        return G, E, rE
+
+    def __call__(self, params):
+        D, Dw, A, g, lam = self.decoders(params)
+        G, E, rE = self.metrics(Dw)
+        J = E.shape[1]
+        proj = np.einsum("bjk,jk->bj", rE, self.U)
+        Ebar = E.mean(axis=1, keepdims=True)
+        q = E / Ebar - 1.0
+        loss = (1.0 - proj).mean(axis=1) + self.beta * (q * q).mean(axis=1)
+
+        # d loss / d G, all starts and grid points at once
+        su = self.U @ self.S.T                                           # (J, L)
+        dG = -2.0 * G * (su - proj[:, :, None]) / (J * E[:, :, None])
+        dE = (2.0 * self.beta / J) * (q - (q * (q + 1.0)).mean(axis=1, keepdims=True)) / Ebar
+        dG += 2.0 * G * dE[:, :, None]
+
+        dDw = np.matmul(dG.transpose(0, 2, 1), self.Y)                    # (B, L, C)
+        dg = np.zeros_like(g)
+        np.add.at(dg.T, self.degree, (dDw * D).sum(axis=1).T)
+        dD = dDw * g[:, None, self.degree]
+        dlam = -(np.linalg.solve(A, dD) * D).sum(axis=(1, 2))
+        return loss, np.concatenate([dg[:, 1:], (lam * dlam)[:, None]], axis=1)
+
+MU_MIN = 1e-9
+
+def optimize(objective, order, steps=400, rate=0.03, mu=(1e-6, 1e-3, 1e-1), patience=25, tol=1e-6,
+             max_weight=8.0, max_mu=1e3):
+    """
+    Batched Adam over several starts; returns the best (params, loss). Stops
+    early once no start improved by more than `tol` for `patience` steps.
+    The box 0 <= g_l <= max_weight, MU_MIN <= mu <= max_mu only guards against
+    runaway steps; a result on an upper bound means the box was too tight.
+    """
+    maxre = maxre_weights(order)[1:]
+    starts = []
+    for m in mu:
+        for g in (np.ones(order), maxre, 0.5 * (1.0 + maxre)):
+            starts.append(np.append(g, np.log(m)))
+    x = np.array(starts)
+    lo = np.append(np.zeros(order), np.log(MU_MIN))
+    hi = np.append(np.full(order, max_weight), np.log(max_mu))
+    m1 = np.zeros_like(x)
+    m2 = np.zeros_like(x)
+    best = np.full(len(x), np.inf)
+    best_x = x.copy()
+    stale = 0
+    for t in range(1, steps + 1):
+        loss, grad = objective(x)
+        stale = stale + 1 if np.all(loss > best - tol) else 0
+        better = loss < best
+        best[better] = loss[better]
+        best_x[better] = x[better]
+        if stale >= patience:
+            break
+        m1 = 0.9 * m1 + 0.1 * grad
+        m2 = 0.999 * m2 + 0.001 * grad * grad
+        step = rate * (m1 / (1 - 0.9 ** t)) / (np.sqrt(m2 / (1 - 0.999 ** t)) + 1e-12)
+        x = np.clip(x - step, lo, hi)
+    i = np.argmin(best)
+    return best_x[i], best[i]
+
+def bound_warnings(params, max_weight, max_mu):
+    """Parameters that ended on the optimizer's box (g_l = 0 just drops order l)."""
+    out = []
+    g, mu = params[:-1], np.exp(params[-1])
+    for l in np.flatnonzero(g >= max_weight * 0.99) + 1:
+        out.append(f"weight g{l} at --max-weight {max_weight:g}")
+    if mu >= max_mu * 0.99:
+        out.append(f"mu at --max-mu {max_mu:g}")
+    elif mu <= MU_MIN * 1.01:
+        out.append(f"mu at its lower bound {MU_MIN:g}")
+    return out
+
+def summary(objective, D):
+    _, E, rE = objective.metrics(D[None])
+    length = np.linalg.norm(rE[0], axis=1)
+    cosang = np.einsum("jk,jk->j", rE[0], objective.U) / length
+    angle = np.degrees(np.arccos(np.clip(cosang, -1.0, 1.0)))
+    E_db = 10.0 * np.log10(E[0] / E[0].mean())
+    return (f"|rE| mean {length.mean():.3f}  angle err mean {angle.mean():5.1f} max {angle.max():5.1f} deg  "
+            f"energy {E_db.min():+.2f}..{E_db.max():+.2f} dB")
+
+def read_speakers(path):
+    """One 'azimuth elevation' pair in degrees per line -> radians (L, 2)."""
+    return np.radians(np.loadtxt(path, ndmin=2)[:, :2])
+
+def main():
+    parser = argparse.ArgumentParser(description="Optimize per-order weights and regularization of a decoder.")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--layout", choices=sorted(LAYOUTS), help="Generator layout")
+    src.add_argument("--speakers", help="Text file, 'azimuth elevation' (degrees) per line")
+    src.add_argument("--fibonacci", type=int, metavar="N", help="N near-uniform speakers (test layout)")
+    parser.add_argument("--order", type=int, default=3)
+    parser.add_argument("--norm", choices=["N3D", "SN3D"], default="N3D")
+    parser.add_argument("--beta", type=float, default=1.0, help="Weight of the energy flatness term")
+    parser.add_argument("--steps", type=int, default=400)
+    parser.add_argument("--max-weight", type=float, default=8.0, help="Upper bound of the per-order weights")
+    parser.add_argument("--max-mu", type=float, default=1e3, help="Upper bound of the regularization mu")
+    parser.add_argument("--out", help="Output coefficient file (default: <N>OA_<layout>_<norm>_Opt.txt)")
+    args = parser.parse_args()
+
+    if args.layout:
+        name, speakers = args.layout, np.asarray(LAYOUTS[args.layout], dtype=np.float64)
+    elif args.speakers:
+        name = os.path.splitext(os.path.basename(args.speakers))[0].replace("_", "")
+        speakers = read_speakers(args.speakers)
+    else:
+        name, speakers = f"Fib{args.fibonacci}", fibonacci_directions(args.fibonacci)
+    if len(speakers) < 2:
+        sys.exit("need at least two speakers")
+
+    objective = DecoderObjective(speakers, args.order, args.norm, beta=args.beta)
+    params, loss = optimize(objective, args.order, args.steps,
+                            max_weight=args.max_weight, max_mu=args.max_mu)
+    D, Dw, _, g, lam = objective.decoders(params[None])
+    basic = build_decoder(speakers, args.order, args.norm)
+    # same mean grid energy as the pinv decoder
+    Dw = Dw[0] * np.sqrt(objective.metrics(basic[None])[1].mean() / objective.metrics(Dw)[1].mean())
+
+    print(f"{len(speakers)} speakers, order {args.order}, {len(objective.Y)} grid directions")
+    print(f"weights {np.round(g[0], 3).tolist()}  mu {np.exp(params[-1]):.2e}  loss {loss:.4f}")
+    print(f"  pinv:      {summary(objective, basic)}")
+    print(f"  max-rE:    {summary(objective, build_decoder(speakers, args.order, args.norm, 'maxre'))}")
+    print(f"  optimized: {summary(objective, Dw)}")
+    for w in bound_warnings(params, args.max_weight, args.max_mu):
+        print(f"warning: {w}; the optimum may lie outside, raise the bound", file=sys.stderr)
+    out = args.out or f"{args.order}OA_{name}_{args.norm}_Opt.txt"
+    write_list(out, Dw.round(7))
+    print(f"Wrote {out}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except BrokenPipeError:
+        # downstream stage exited early (e.g. `| head`)
+        sys.stderr.close()
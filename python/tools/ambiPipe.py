@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+import os
+import sys
+import stat
+import struct
+import argparse
+import numpy as np
+
+from ambiWav import WavReader, WavWriter
+
+"""
+Raw float32 Pipe Streams
+------------------------
+A minimal stream format for chaining the offline tools as processes
+(render | decode | meter) without intermediate files. A 16-byte header is
+followed by interleaved little-endian float32 frames until EOF:
+
+    magic    4s   b"AMBP"
+    version  u8   1
+    order    i8   ambisonic order, -1 for speaker feeds / plain audio
+    channels u16
+    rate     u32  sample rate in Hz
+    norm     4s   b"N3D ", b"SN3D" or b"    " (unknown / not ambisonic)
+
+Readers pull fixed-size blocks, writers flush every block, so memory stays
+bounded and the OS pipe buffer provides back-pressure between stages.
+
+Any tool path given as '-' means stdin/stdout; a named pipe (mkfifo) or a
+'.ambp' file is also read/written in this format. An '.amba' input is read
+from a seekable archive (see ambiArchive.py). Everything else is WAV.
+
+USAGE:
+    python ambiPipe.py cat rec.wav --norm N3D | python ambiDecode.py - out.wav --dec 3OA_Oct_N3D.txt
+        -> WAV to stream (order inferred from the channel count)
+
+    ... | python ambiPipe.py save out.wav
+        -> stream to 32-bit float WAV
+
+    python ambiPipe.py info < stream.ambp
+"""
+
+MAGIC = b"AMBP"
+VERSION = 1
+HEADER = struct.Struct("<4sBbHI4s")
+
+class PipeWriter:
+    def __init__(self, f, channels, rate, order=-1, norm=None):
+        self.f = f
+        self.channels = channels
+        self.rate = int(rate)
+        self.order = order
+        self.norm = norm
+        self.frames = 0
+        self.f.write(HEADER.pack(MAGIC, VERSION, order, channels, self.rate,
+                                 (norm or "").upper().ljust(4).encode("ascii")))
+        self.f.flush()
+
+    def write(self, block):
+        block = np.ascontiguousarray(block, dtype="<f4").reshape(-1, self.channels)
+        self.f.write(block.tobytes())
+        self.f.flush()
+        self.frames += block.shape[0]
+
+    def close(self):
+        try:
+            self.f.flush()
+        except BrokenPipeError:
+            pass
+        if self.f is not sys.stdout.buffer:
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class PipeReader:
+    def __init__(self, f):
+        self.f = f
+        head = self._read_exact(HEADER.size)
+        if len(head) < HEADER.size:
+            raise ValueError("stream ended before header")
+        magic, version, self.order, self.channels, self.rate, norm = HEADER.unpack(head)
+        if magic != MAGIC:
+            raise ValueError("not an AMBP stream")
+        if version != VERSION:
+            raise ValueError(f"unsupported AMBP version {version}")
+        self.norm = norm.decode("ascii").strip() or None
+        self.frame_bytes = 4 * self.channels
+        self.frames = None  # unknown until EOF
+        self.pos = 0
+
+    def _read_exact(self, n):
+        chunks = []
+        while n > 0:
+            chunk = self.f.read(n)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            n -= len(chunk)
+        return b"".join(chunks)
+
+    def read(self, n):
+        """Next n frames (fewer at EOF) as float32 (frames, channels)."""
+        raw = self._read_exact(n * self.frame_bytes)
+        raw = raw[:len(raw) - len(raw) % self.frame_bytes]
+        self.pos += len(raw) // self.frame_bytes
+        return np.frombuffer(raw, dtype="<f4").reshape(-1, self.channels)
+
+    def blocks(self, blocksize):
+        while True:
+            block = self.read(blocksize)
+            if not len(block):
+                return
+            yield block
+
+    def close(self):
+        if self.f is not sys.stdin.buffer:
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def is_stream(path):
+    if path == "-" or path.endswith(".ambp"):
+        return True
+    return os.path.exists(path) and stat.S_ISFIFO(os.stat(path).st_mode)
+
+def open_input(path):
+    """WavReader, ArchiveReader or PipeReader; all give .channels, .rate, .read(n), .blocks(n)."""
+    if path.endswith(".amba"):
+        from ambiArchive import ArchiveReader   # ambiArchive imports this module
+        return ArchiveReader(path)
+    if not is_stream(path):
+        return WavReader(path)
+    return PipeReader(sys.stdin.buffer if path == "-" else open(path, "rb"))
+
+def open_output(path, channels, rate, order=-1, norm=None):
+    """WavWriter or PipeWriter; order/norm only reach the stream header."""
+    if not is_stream(path):
+        return WavWriter(path, channels, rate)
+    return PipeWriter(sys.stdout.buffer if path == "-" else open(path, "wb"),
+                      channels, rate, order, norm)
+
+def stream_order(reader):
+    """Ambisonic order from a stream header, or inferred from a WAV channel count."""
+    order = getattr(reader, "order", -1)
+    if order >= 0:
+        return order
+    order = int(np.sqrt(reader.channels)) - 1
+    return order if (order + 1) ** 2 == reader.channels else -1
+
+def log(msg):
+    # stdout may be carrying audio
+    print(msg, file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert between WAV and AMBP float32 streams.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("cat", help="WAV -> stream on stdout")
+    p.add_argument("infile")
+    p.add_argument("--order", type=int, help="Ambisonic order (default: from channel count)")
+    p.add_argument("--norm", choices=["N3D", "SN3D"])
+    p.add_argument("--blocksize", type=int, default=4096)
+    p = sub.add_parser("save", help="stream on stdin -> WAV")
+    p.add_argument("outfile")
+    p.add_argument("--blocksize", type=int, default=4096)
+    sub.add_parser("info", help="print the stream header")
+    args = parser.parse_args()
+
+    if args.cmd == "cat":
+        with WavReader(args.infile) as reader:
+            order = stream_order(reader) if args.order is None else args.order
+            with PipeWriter(sys.stdout.buffer, reader.channels, reader.rate, order,
+                            args.norm) as writer:
+                for block in reader.blocks(args.blocksize):
+                    writer.write(block)
+    elif args.cmd == "save":
+        with PipeReader(sys.stdin.buffer) as reader:
+            with WavWriter(args.outfile, reader.channels, reader.rate) as writer:
+                for block in reader.blocks(args.blocksize):
+                    writer.write(block)
+        log(f"Wrote {args.outfile}")
+    else:
+        reader = PipeReader(sys.stdin.buffer)
+        print(f"channels={reader.channels} rate={reader.rate} order={reader.order} "
+              f"norm={reader.norm or '-'}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except BrokenPipeError:
+        # downstream stage exited early (e.g. `| head`)
+        sys.stderr.close()
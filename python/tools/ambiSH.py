@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+import os
+import re
+import numpy as np
+
+"""
+Shared Ambisonics math for the offline tools
+--------------------------------------------
+Vectorized real spherical harmonics (ACN order, N3D or SN3D), the speaker
+layouts used by the decoder generators, and readers/writers for the
+Pd-format coefficient lists in 'ambiCoefficients'.
+
+The SH match the per-channel formulas in python/3OA-N3D (no Condon-Shortley
+phase) and extend them to any order, evaluated for many directions at once.
+
+Conventions:
+    Azimuth: 0 = front; pi/2 = left; pi = rear; 3pi/2 = right
+    Elevation: 0 = horizontal; pi/2 = zenith; -pi/2 = nadir
+    Coefficient files: one 'value;' per line, speaker-major
+        (all channels of speaker 1, then speaker 2, ...)
+"""
+
+ACN_NAMES = "WYZXVTRSUQOMKLNP"
+
+# Same speaker lists as the generators in python/3OA-N3D, [azimuth, elevation] (radians)
+LAYOUTS = {
+    "Stereo": [
+        [np.pi / 4, 0],
+        [7 * np.pi / 4, 0],
+    ],
+    "Quad": [
+        [np.pi / 4, 0],
+        [7 * np.pi / 4, 0],
+        [5 * np.pi / 4, 0],
+        [3 * np.pi / 4, 0],
+    ],
+    "Oct": [[(k * np.pi / 4) + (np.pi / 8), 0] for k in (0, 7, 6, 5, 4, 3, 2, 1)],
+    "VCCM": [[k * np.pi / 4, 0] for k in (1, 0, 7, 6, 5, 4, 3, 2)]
+          + [[(k * np.pi / 4) - (np.pi / 8), np.pi / 4] for k in (1, 0, 7, 6, 5, 4, 3, 2)],
+}
+
+def num_channels(order):
+    return (order + 1) ** 2
+
+def order_from_channels(n):
+    order = int(round(np.sqrt(n))) - 1
+    if num_channels(order) != n:
+        raise ValueError(f"{n} channels is not a full-sphere ambisonic order")
+    return order
+
+def acn_degree(order):
+    """Degree l of every ACN channel up to `order`."""
+    return np.repeat(np.arange(order + 1), 2 * np.arange(order + 1) + 1)
+
+def sh_n3d(order, azi, ele):
+    """
+    Real N3D spherical harmonics for arrays of directions.
+    Returns shape azi.shape + ((order + 1)**2,), ACN order.
+    """
+    azi = np.asarray(azi, dtype=np.float64)
+    ele = np.asarray(ele, dtype=np.float64)
+    azi, ele = np.broadcast_arrays(azi, ele)
+    x = np.sin(ele)
+    c = np.cos(ele)
+    out = np.empty(azi.shape + (num_channels(order),), dtype=np.float64)
+
+    # Associated Legendre P_l^m(sin ele) without Condon-Shortley phase
+    P = {(0, 0): np.ones_like(x)}
+    for m in range(1, order + 1):
+        P[(m, m)] = (2 * m - 1) * c * P[(m - 1, m - 1)]
+    for m in range(0, order):
+        P[(m + 1, m)] = (2 * m + 1) * x * P[(m, m)]
+    for m in range(0, order + 1):
+        for l in range(m + 2, order + 1):
+            P[(l, m)] = ((2 * l - 1) * x * P[(l - 1, m)] - (l + m - 1) * P[(l - 2, m)]) / (l - m)
+
+    for l in range(order + 1):
+        for m in range(-l, l + 1):
+            am = abs(m)
+            norm = np.sqrt((2 * l + 1) * (2.0 if am else 1.0)
+                           * np.prod(np.arange(l - am + 1, l + am + 1, dtype=np.float64)) ** -1.0)
+            trig = np.sin(am * azi) if m < 0 else np.cos(am * azi)
+            out[..., l * l + l + m] = norm * P[(l, am)] * trig
+    return out
+
+def apply_normalization(sh, norm, order=None):
+    """Convert N3D SH (last axis ACN) to `norm`; SN3D divides order-l by sqrt(2l+1)."""
+    if norm.upper() == 'N3D':
+        return sh
+    if norm.upper() != 'SN3D':
+        raise ValueError("norm must be 'SN3D' or 'N3D'")
+    if order is None:
+        order = order_from_channels(sh.shape[-1])
+    return sh / np.sqrt(2.0 * acn_degree(order) + 1.0)
+
+def sh(order, azi, ele, norm='N3D'):
+    return apply_normalization(sh_n3d(order, azi, ele), norm, order)
+
+def maxre_weights(order):
+    """Per-degree max-rE weights g_l = P_l(cos(137.9 deg / (N + 1.51)))."""
+    x = np.cos(np.radians(137.9) / (order + 1.51))
+    g = [1.0, x]
+    for l in range(2, order + 1):
+        g.append(((2 * l - 1) * x * g[l - 1] - (l - 1) * g[l - 2]) / l)
+    return np.asarray(g[:order + 1])
+
+def build_decoder(speakers, order, norm='SN3D', weighting='basic'):
+    """
+    Pseudo-inverse decoder, shape (num speakers, num channels), as in the
+    generators. weighting='maxre' applies energy-preserving max-rE weights.
+    """
+    speakers = np.asarray(speakers, dtype=np.float64)
+    K = sh(order, speakers[:, 0], speakers[:, 1], norm)
+    D = np.linalg.pinv(K).T
+    if weighting == 'maxre':
+        g = maxre_weights(order)[acn_degree(order)]
+        D = D * (g * np.sqrt(len(g) / np.sum(g ** 2)))
+    return D.round(7)
+
+# --- Coefficient files ---
+
+def read_list(path):
+    with open(path) as f:
+        text = f.read()
+    return np.array([float(v) for v in text.replace("\n", " ").split(";") if v.strip()],
+                    dtype=np.float64)
+
+def write_list(path, values):
+    with open(path, "w") as f:
+        for element in np.ravel(values):
+            f.write(f"{element};\n")
+
+def parse_coefficient_name(path):
+    """'3OA_Oct_SN3D_HF.txt' -> (3, 'Oct', 'SN3D'). Missing norm means N3D."""
+    m = re.match(r"(\d+)OA_([A-Za-z0-9]+?)(?:_(N3D|SN3D))?(?:_[A-Za-z]+)?\.txt$",
+                 os.path.basename(path))
+    if not m:
+        raise ValueError(f"cannot parse coefficient file name '{path}'")
+    return int(m.group(1)), m.group(2), m.group(3) or 'N3D'
+
+def read_decoder(path, order=None):
+    """Read a coefficient list as a (num speakers, num channels) matrix."""
+    if order is None:
+        order = parse_coefficient_name(path)[0]
+    values = read_list(path)
+    n = num_channels(order)
+    if len(values) % n:
+        raise ValueError(f"{path}: {len(values)} values is not a multiple of {n} channels")
+    return values.reshape(-1, n)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+import os
+import sys
+import argparse
+import numpy as np
+
+from ambiSH import sh, acn_degree
+from ambiPipe import open_input, open_output, is_stream
+
+"""
+Source Width (Spread) Encoding
+------------------------------
+Widening a source is a per-order weighting in the SH domain: a source spread
+evenly over a spherical cap of angular width w has the SH spectrum of a point
+source times
+    g_l(w) = (P_{l-1}(c) - P_{l+1}(c)) / ((2l + 1) (1 - c)),  c = cos(w / 2)
+(Funk-Hecke for the cap), with g_0 = 1. The weights are energy-normalized
+like the max-rE weights, so a source keeps its loudness as it widens:
+w = 0 is a point source, w = 360 leaves only W.
+
+Because the weights are per order, the live encoder needs no extra signal
+objects: ambiNorm already scales every channel by a per-order factor, and
+with a width sent to ambiNilla3~'s rightmost inlet it multiplies that factor
+by the table value. A wide source costs the same DSP as a point source.
+
+    tables   Writes the weight tables main.pd loads into the arrays
+             ambiSpread0..ambiSpread3 (one per degree l). Each holds
+             (max order + 1) * 361 values; index = order * 361 + width (deg),
+             so the table follows ambiOrder. Plain one-value-per-line files
+             for the arrays' 'read' message.
+
+    encode   Offline spread encoding of a mono file. With --decorrelate K the
+             source is instead split into K point sources covering the cap,
+             each fed through its own random-phase allpass FIR, which avoids
+             the phasiness of a coherent wide source (not available live).
+
+USAGE:
+    python ambiSpread.py tables          (writes ambiSpread/ next to main.pd)
+    python ambiSpread.py encode in.wav out.wav --azi 30 --ele 0 --width 90
+    python ambiSpread.py encode in.wav - --width 180 --decorrelate 8 | ...
+"""
+
+WIDTH_POINTS = 361   # 0..360 degrees in 1 degree steps
+
+def legendre(order, x):
+    """P_0..P_order at x, shape (order + 1,) + x.shape."""
+    x = np.asarray(x, dtype=np.float64)
+    P = [np.ones_like(x), x]
+    for l in range(2, order + 1):
+        P.append(((2 * l - 1) * x * P[l - 1] - (l - 1) * P[l - 2]) / l)
+    return np.stack(P[:order + 1])
+
+def spread_weights(order, width):
+    """Energy-normalized per-degree weights for widths in degrees, shape width.shape + (order + 1,)."""
+    width = np.clip(np.asarray(width, dtype=np.float64), 0.0, 360.0)
+    c = np.cos(np.radians(width) / 2.0)
+    P = legendre(order + 1, c)
+    l = np.arange(1, order + 1).reshape((-1,) + (1,) * c.ndim)
+    point = width < 1e-6
+    area = np.where(point, 1.0, 1.0 - c)
+    g = np.concatenate([np.ones((1,) + c.shape), (P[:-2] - P[2:]) / ((2 * l + 1) * area)])
+    g = np.where(point, 1.0, g)
+    # keep the energy of a point source: sum (2l + 1) g_l^2 = (N + 1)^2
+    dim = 2.0 * np.arange(order + 1) + 1.0
+    g *= np.sqrt(dim.sum() / np.tensordot(dim, g ** 2, axes=1))
+    return np.moveaxis(g, 0, -1)
+
+def spread_tables(max_order=3):
+    """Per-degree arrays for Pd: tables[l][order * 361 + width]."""
+    widths = np.arange(WIDTH_POINTS, dtype=np.float64)
+    tables = np.zeros((max_order + 1, (max_order + 1) * WIDTH_POINTS))
+    for order in range(max_order + 1):
+        g = spread_weights(order, widths)
+        tables[:order + 1, order * WIDTH_POINTS:(order + 1) * WIDTH_POINTS] = g.T
+    return tables
+
+def export_tables(outdir, max_order=3):
+    os.makedirs(outdir, exist_ok=True)
+    for l, table in enumerate(spread_tables(max_order)):
+        path = os.path.join(outdir, f"ambiSpread{l}.txt")
+        with open(path, "w") as f:
+            for v in table:
+                f.write(f"{v:.7f}\n")
+        print(f"Wrote {path}")
+
+def cap_directions(azi, ele, width, count):
+    """`count` directions spread evenly (Fibonacci) over the cap, radians in, radians out."""
+    i = np.arange(count) + 0.5
+    z = 1.0 - (1.0 - np.cos(np.radians(width) / 2.0)) * i / count
+    r = np.sqrt(1.0 - z ** 2)
+    a = i * np.pi * (3.0 - np.sqrt(5.0))
+    local = np.stack([z, r * np.cos(a), r * np.sin(a)], axis=1)   # pole along x
+    # rotate the pole to (azi, ele)
+    u = np.array([np.cos(ele) * np.cos(azi), np.cos(ele) * np.sin(azi), np.sin(ele)])
+    v = np.array([-np.sin(azi), np.cos(azi), 0.0])
+    w = np.cross(u, v)
+    d = local @ np.stack([u, v, w])
+    return np.arctan2(d[:, 1], d[:, 0]), np.arcsin(np.clip(d[:, 2], -1.0, 1.0))
+
+def decorrelators(count, taps, seed=0):
+    """Random-phase unit-energy FIRs with a half-Hann fade, shape (count, taps)."""
+    rng = np.random.default_rng(seed)
+    phase = rng.uniform(-np.pi, np.pi, (count, taps // 2 + 1))
+    phase[:, 0] = 0.0
+    h = np.fft.irfft(np.exp(1j * phase), taps, axis=1)
+    h *= np.hanning(2 * taps + 1)[taps:-1]
+    return h / np.linalg.norm(h, axis=1, keepdims=True)
+
+class SpreadEncoder:
+    """Mono -> B-format for a source of `width` degrees; (azi, ele) in radians."""
+
+    def __init__(self, order, azi, ele, width, norm="N3D", decorrelate=0, taps=1024, seed=0):
+        if decorrelate:
+            vazi, vele = cap_directions(azi, ele, width, decorrelate)
+            self.Y = sh(order, vazi, vele, norm) / np.sqrt(decorrelate)   # (K, channels)
+            self.h = decorrelators(decorrelate, taps, seed)
+            self.tail = np.zeros((decorrelate, taps - 1))
+            self.spectra = {}
+        else:
+            g = spread_weights(order, width)[acn_degree(order)]
+            self.Y = sh(order, np.atleast_1d(azi), np.atleast_1d(ele), norm) * g
+            self.h = None
+
+    def _convolve(self, x):
+        n, taps = len(x), self.h.shape[1]
+        nfft = 1 << int(np.ceil(np.log2(n + taps - 1)))
+        if nfft not in self.spectra:
+            self.spectra[nfft] = np.fft.rfft(self.h, nfft, axis=1)
+        y = np.fft.irfft(np.fft.rfft(x, nfft) * self.spectra[nfft], nfft, axis=1)[:, :n + taps - 1]
+        y[:, :taps - 1] += self.tail
+        self.tail = y[:, n:].copy()
+        return y[:, :n]
+
+    def process(self, x):
+        """x: (frames,) mono -> (frames, channels)."""
+        if self.h is None:
+            return x[:, None] * self.Y[0]
+        return self._convolve(x).T @ self.Y
+
+    def flush(self):
+        """Decorrelator ring-out after the last block."""
+        if self.h is None:
+            return np.zeros((0, self.Y.shape[1]))
+        return self.tail.T @ self.Y
+
+def encode(infile, outfile, order, norm, azi, ele, width, decorrelate, blocksize=8192):
+    with open_input(infile) as reader:
+        enc = SpreadEncoder(order, np.radians(azi), np.radians(ele), width, norm, decorrelate)
+        with open_output(outfile, (order + 1) ** 2, reader.rate, order, norm) as writer:
+            for block in reader.blocks(blocksize):
+                writer.write(enc.process(block[:, 0].astype(np.float64)))
+            writer.write(enc.flush())
+
+def main():
+    here = os.path.dirname(os.path.abspath(__file__))
+    repo = os.path.normpath(os.path.join(here, "..", ".."))
+    parser = argparse.ArgumentParser(description="Source width (spread) encoding tables and offline encoder.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("tables", help="Write the Pd spread weight tables")
+    p.add_argument("--order", type=int, default=3, help="Highest order in the tables")
+    p.add_argument("--out", default=os.path.join(repo, "ambiSpread"),
+                   help="Output directory (default: ambiSpread next to main.pd)")
+    p = sub.add_parser("encode", help="Spread-encode a mono file")
+    p.add_argument("infile", help="Mono WAV, .amba archive or '-' for a stream (first channel is used)")
+    p.add_argument("outfile", help="B-format WAV (32-bit float) or '-' for a stream")
+    p.add_argument("--azi", type=float, default=0.0, help="Azimuth in degrees (0 = front, 90 = left)")
+    p.add_argument("--ele", type=float, default=0.0, help="Elevation in degrees")
+    p.add_argument("--width", type=float, default=0.0, help="Source width in degrees (0-360)")
+    p.add_argument("--order", type=int, default=3)
+    p.add_argument("--norm", choices=["N3D", "SN3D"], default="N3D")
+    p.add_argument("--decorrelate", type=int, default=0, metavar="K",
+                   help="Split into K decorrelated point sources instead of weighting")
+    args = parser.parse_args()
+
+    if args.cmd == "tables":
+        export_tables(args.out, args.order)
+        return
+    if not 0.0 <= args.width <= 360.0:
+        sys.exit("--width must be between 0 and 360 degrees")
+    encode(args.infile, args.outfile, args.order, args.norm, args.azi, args.ele,
+           args.width, args.decorrelate)
+    if not is_stream(args.outfile):
+        print(f"Wrote {args.outfile}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except BrokenPipeError:
+        # downstream stage exited early (e.g. `| head`)
+        sys.stderr.close()
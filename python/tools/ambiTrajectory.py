@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+import sys
+import json
+import argparse
+import numpy as np
+
+from ambiSH import sh
+from ambiPipe import open_input, open_output, is_stream
+from ambiBatchRender import interpolate_trajectory
+
+"""
+Trajectory Engine
+-----------------
+Source motion in ambiNilla3 is a stream of control messages, so fast moves
+step once per message and zipper. This module describes motion as a
+trajectory, evaluates it for whole blocks at once and interpolates the SH
+gains per sample:
+
+    positions   one vectorized evaluation per block at control points
+                every --hop frames (default 32)
+    gains       SH at those points, then a per-sample linear ramp between
+                them as two broadcast products over the block
+                (--hop 1 evaluates the SH at every sample)
+
+so smooth motion costs a small constant per block, not per-sample Python.
+
+TRAJECTORY (JSON, angles in degrees, times in seconds):
+    {"type": "keyframes", "interp": "spline", "keys": [[0, 0, 0], [2, 90, 30], [4, 180, 0]]}
+        interp "linear" (as ambiBatchRender.py) or "spline" (Catmull-Rom)
+    {"type": "circle", "azi": 0, "ele": 10, "period": 4.0, "direction": 1}
+        constant elevation, one turn per period (direction -1 = clockwise)
+    {"type": "orbit", "tilt": 30, "axis": 0, "period": 6.0, "phase": 0}
+        great circle tilted by `tilt` around the horizontal axis at azimuth `axis`
+    A bare keyframe list [[t, azi, ele], ...] is linear keyframes.
+
+OUTPUTS:
+    encode    mono file -> B-format along the trajectory (per-sample gains)
+    gains     per-sample SH gain stream, (frames, channels); multiplying a
+              mono signal by it encodes it
+    control   pre-decimated control stream for ambiNilla3 live: a [qlist]
+              file of 'delay_ms thetaRadians azi;' / 'phiRadians ele;'
+              lines (the receives in main.pd; 'read', then 'bang' to play).
+              A point is only sent when the source moved --min-step degrees
+              or --max-gap ms passed, at most every --interval ms.
+
+USAGE:
+    python ambiTrajectory.py encode orbit.json in.wav out.wav --order 3
+    python ambiTrajectory.py gains orbit.json gains.wav --duration 8
+    python ambiTrajectory.py control orbit.json orbit.txt --duration 8 --interval 10
+"""
+
+def _unit(azi, ele):
+    azi, ele = np.broadcast_arrays(azi, ele)
+    return np.stack([np.cos(ele) * np.cos(azi), np.cos(ele) * np.sin(azi), np.sin(ele)], axis=-1)
+
+class Keyframes:
+    def __init__(self, keys, interp="linear"):
+        k = np.asarray(keys, dtype=np.float64)[:, :3]
+        self.keys = k[np.argsort(k[:, 0], kind="stable")]
+        self.interp = interp
+        if interp == "spline" and len(self.keys) > 2:
+            t = self.keys[:, 0]
+            p = np.stack([np.unwrap(np.radians(self.keys[:, 1])), np.radians(self.keys[:, 2])], axis=1)
+            # Catmull-Rom tangents for uneven key spacing, one-sided at the ends
+            m = np.empty_like(p)
+            m[1:-1] = (p[2:] - p[:-2]) / (t[2:] - t[:-2])[:, None]
+            m[0] = (p[1] - p[0]) / (t[1] - t[0])
+            m[-1] = (p[-1] - p[-2]) / (t[-1] - t[-2])
+            self.t, self.p, self.m = t, p, m
+        else:
+            self.interp = "linear"
+
+    def positions(self, t):
+        if self.interp == "linear":
+            return interpolate_trajectory(self.keys, t)
+        tk, p, m = self.t, self.p, self.m
+        tc = np.clip(t, tk[0], tk[-1])
+        i = np.clip(np.searchsorted(tk, tc, side="right") - 1, 0, len(tk) - 2)
+        h = (tk[i + 1] - tk[i])[:, None]
+        s = ((tc - tk[i])[:, None] / h)
+        s2, s3 = s * s, s * s * s
+        out = ((2 * s3 - 3 * s2 + 1) * p[i] + (s3 - 2 * s2 + s) * h * m[i]
+               + (-2 * s3 + 3 * s2) * p[i + 1] + (s3 - s2) * h * m[i + 1])
+        return out[:, 0], np.clip(out[:, 1], -np.pi / 2, np.pi / 2)
+
+class Circle:
+    def __init__(self, azi=0.0, ele=0.0, period=4.0, direction=1):
+        self.azi = np.radians(azi)
+        self.ele = np.radians(ele)
+        self.speed = direction * 2.0 * np.pi / period
+
+    def positions(self, t):
+        return self.azi + self.speed * t, np.full(np.shape(t), self.ele)
+
+class Orbit:
+    def __init__(self, tilt=0.0, axis=0.0, period=4.0, phase=0.0, direction=1):
+        self.phase = np.radians(phase)
+        self.speed = direction * 2.0 * np.pi / period
+        # Rodrigues rotation of the horizontal circle about the axis
+        a = _unit(np.radians(axis), 0.0)
+        K = np.array([[0, -a[2], a[1]], [a[2], 0, -a[0]], [-a[1], a[0], 0]])
+        tilt = np.radians(tilt)
+        self.R = np.eye(3) + np.sin(tilt) * K + (1 - np.cos(tilt)) * K @ K
+
+    def positions(self, t):
+        v = _unit(self.phase + self.speed * np.asarray(t), 0.0) @ self.R.T
+        return np.arctan2(v[:, 1], v[:, 0]), np.arcsin(np.clip(v[:, 2], -1.0, 1.0))
+
+def load_trajectory(spec):
+    """Trajectory from a JSON object (or bare keyframe list), see the module notes."""
+    if isinstance(spec, list):
+        return Keyframes(spec)
+    kind = spec.get("type", "keyframes")
+    if kind == "keyframes":
+        return Keyframes(spec["keys"], spec.get("interp", "linear"))
+    if kind == "circle":
+        return Circle(spec.get("azi", 0.0), spec.get("ele", 0.0), spec.get("period", 4.0),
+                      spec.get("direction", 1))
+    if kind == "orbit":
+        return Orbit(spec.get("tilt", 0.0), spec.get("axis", 0.0), spec.get("period", 4.0),
+                     spec.get("phase", 0.0), spec.get("direction", 1))
+    raise ValueError(f"unknown trajectory type '{kind}'")
+
+class GainStream:
+    """Per-sample SH gains along a trajectory, one block at a time."""
+
+    def __init__(self, trajectory, order, rate, norm="N3D", hop=32):
+        self.trajectory = trajectory
+        self.order = order
+        self.rate = rate
+        self.norm = norm
+        self.hop = hop
+        self.w = (np.arange(hop) / hop).astype(np.float32)[:, None]
+        self.pos = 0
+
+    def gains(self, frames):
+        """Next `frames` frames of gains, float32 (frames, channels)."""
+        hop = self.hop
+        K = -(-frames // hop)
+        t = (self.pos + np.arange(K + 1) * hop) / self.rate
+        Y = sh(self.order, *self.trajectory.positions(t), self.norm).astype(np.float32)
+        if hop == 1:
+            G = Y[:-1]
+        else:
+            # ramp node k -> k + 1 across each hop, for all hops at once
+            G = (Y[:-1, None] * (1.0 - self.w) + Y[1:, None] * self.w).reshape(K * hop, -1)
+        self.pos += frames
+        return G[:frames]
+
+    def encode(self, block):
+        """Mono (frames,) -> B-format (frames, channels)."""
+        return self.gains(len(block)) * block[:, None]
+
+def control_stream(trajectory, duration, interval=0.01, min_step=0.5, max_gap=0.25):
+    """
+    Decimated (time, azi, ele) points, radians: a point every `interval`
+    seconds at most, only when the source moved `min_step` degrees since the
+    last sent point or `max_gap` seconds passed; the last point is always kept.
+    """
+    t = np.arange(0.0, duration + interval / 2, interval)
+    azi, ele = trajectory.positions(t)
+    u = _unit(azi, ele)
+    cos_step = np.cos(np.radians(min_step))
+    keep = [0]
+    for i in range(1, len(t)):
+        if u[i] @ u[keep[-1]] < cos_step or t[i] - t[keep[-1]] >= max_gap - 1e-9:
+            keep.append(i)
+    if keep[-1] != len(t) - 1:
+        keep.append(len(t) - 1)
+    keep = np.array(keep)
+    return t[keep], azi[keep] % (2.0 * np.pi), ele[keep]
+
+def write_qlist(path, times, azi, ele, receivers=("thetaRadians", "phiRadians")):
+    """[qlist] file: a leading number is the wait in ms before that line."""
+    last = 0.0
+    with open(path, "w") as f:
+        for t, a, e in zip(times, azi, ele):
+            ms = (t - last) * 1000.0
+            f.write(f"{ms:g} {receivers[0]} {a:.6f};\n{receivers[1]} {e:.6f};\n")
+            last = t
+
+def main():
+    parser = argparse.ArgumentParser(description="Trajectories: per-sample SH gains and ambiNilla3 control streams.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("encode", help="Encode a mono file along the trajectory")
+    p.add_argument("trajectory", help="Trajectory (JSON)")
+    p.add_argument("infile", help="Mono WAV, .amba archive or '-' for a stream (first channel is used)")
+    p.add_argument("outfile", help="B-format WAV (32-bit float) or '-' for a stream")
+    p = sub.add_parser("gains", help="Write the per-sample SH gain stream")
+    p.add_argument("trajectory", help="Trajectory (JSON)")
+    p.add_argument("outfile", help="WAV (32-bit float) or '-' for a stream")
+    p.add_argument("--duration", type=float, required=True)
+    p.add_argument("--rate", type=int, default=48000)
+    for p in sub.choices.values():
+        p.add_argument("--order", type=int, default=3)
+        p.add_argument("--norm", choices=["N3D", "SN3D"], default="N3D")
+        p.add_argument("--hop", type=int, default=32, help="Frames between SH evaluations")
+        p.add_argument("--blocksize", type=int, default=8192)
+    p = sub.add_parser("control", help="Write a decimated [qlist] control stream for ambiNilla3")
+    p.add_argument("trajectory", help="Trajectory (JSON)")
+    p.add_argument("outfile", help="qlist text file")
+    p.add_argument("--duration", type=float, required=True)
+    p.add_argument("--interval", type=float, default=10.0, help="Shortest step in ms")
+    p.add_argument("--min-step", type=float, default=0.5, help="Degrees moved before a new point")
+    p.add_argument("--max-gap", type=float, default=250.0, help="Longest step in ms")
+    p.add_argument("--receivers", nargs=2, default=["thetaRadians", "phiRadians"])
+    args = parser.parse_args()
+
+    try:
+        with open(args.trajectory) as f:
+            trajectory = load_trajectory(json.load(f))
+    except (ValueError, KeyError) as e:
+        sys.exit(f"{args.trajectory}: {e}")
+
+    if args.cmd == "control":
+        times, azi, ele = control_stream(trajectory, args.duration, args.interval / 1000.0,
+                                         args.min_step, args.max_gap / 1000.0)
+        write_qlist(args.outfile, times, azi, ele, args.receivers)
+        print(f"Wrote {args.outfile}: {len(times)} points over {args.duration:g}s")
+        return
+
+    channels = (args.order + 1) ** 2
+    if args.cmd == "encode":
+        with open_input(args.infile) as reader:
+            stream = GainStream(trajectory, args.order, reader.rate, args.norm, args.hop)
+            with open_output(args.outfile, channels, reader.rate, args.order, args.norm) as writer:
+                for block in reader.blocks(args.blocksize):
+                    writer.write(stream.encode(block[:, 0]))
+    else:
+        stream = GainStream(trajectory, args.order, args.rate, args.norm, args.hop)
+        frames = int(round(args.duration * args.rate))
+        with open_output(args.outfile, channels, args.rate, args.order, args.norm) as writer:
+            for start in range(0, frames, args.blocksize):
+                writer.write(stream.gains(min(args.blocksize, frames - start)))
+    if not is_stream(args.outfile):
+        print(f"Wrote {args.outfile}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except BrokenPipeError:
+        # downstream stage exited early (e.g. `| head`)
+        sys.stderr.close()
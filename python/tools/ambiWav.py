@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+import struct
+import numpy as np
+
+"""
+Streaming multichannel WAV I/O for the offline tools
+----------------------------------------------------
+Reads the files written by writesf~ in main.pd (16/24/32-bit PCM or 32-bit
+float, any channel count) block by block as float32 arrays of shape
+(frames, channels), and writes 32-bit float WAV the same way. Nothing is
+loaded beyond the requested block.
+"""
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+class WavReader:
+    def __init__(self, path):
+        self.f = open(path, "rb")
+        riff, _, wave = struct.unpack("<4sI4s", self.f.read(12))
+        if riff != b"RIFF" or wave != b"WAVE":
+            raise ValueError(f"{path}: not a RIFF/WAVE file")
+        fmt = None
+        while True:
+            header = self.f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path}: no data chunk")
+            cid, size = struct.unpack("<4sI", header)
+            if cid == b"fmt ":
+                fmt = self.f.read(size + (size & 1))
+            elif cid == b"data":
+                break
+            else:
+                self.f.seek(size + (size & 1), 1)
+        if fmt is None:
+            raise ValueError(f"{path}: data before fmt chunk")
+        tag, self.channels, self.rate, _, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+        if tag == WAVE_FORMAT_EXTENSIBLE:
+            tag = struct.unpack("<H", fmt[24:26])[0]
+        if tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+            raise ValueError(f"{path}: unsupported WAV format tag {tag}")
+        self.is_float = tag == WAVE_FORMAT_IEEE_FLOAT
+        self.sampwidth = bits // 8
+        self.frame_bytes = self.sampwidth * self.channels
+        self.data_start = self.f.tell()
+        self.frames = size // self.frame_bytes
+        self.pos = 0
+
+    def seek(self, frame):
+        self.pos = min(max(frame, 0), self.frames)
+        self.f.seek(self.data_start + self.pos * self.frame_bytes)
+
+    def read(self, n):
+        """Next n frames (fewer at the end) as float32 (frames, channels)."""
+        n = min(n, self.frames - self.pos)
+        raw = self.f.read(n * self.frame_bytes)
+        self.pos += n
+        return self._decode(raw).reshape(n, self.channels)
+
+    def blocks(self, blocksize):
+        while self.pos < self.frames:
+            yield self.read(blocksize)
+
+    def _decode(self, raw):
+        w = self.sampwidth
+        if self.is_float:
+            return np.frombuffer(raw, dtype="<f4" if w == 4 else "<f8").astype(np.float32)
+        if w == 2:
+            return np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+        if w == 3:
+            b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+            v = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+            v = np.where(v & 0x800000, v - 0x1000000, v)
+            return v.astype(np.float32) / 8388608.0
+        if w == 4:
+            return (np.frombuffer(raw, dtype="<i4") / 2147483648.0).astype(np.float32)
+        raise ValueError(f"unsupported sample width {w}")
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class WavWriter:
+    """32-bit float WAV, written incrementally; sizes are patched on close."""
+
+    def __init__(self, path, channels, rate):
+        self.f = open(path, "wb")
+        self.channels = channels
+        self.rate = int(rate)
+        self.frames = 0
+        block_align = 4 * channels
+        # WAVE_FORMAT_EXTENSIBLE so >2 channel float files open everywhere
+        fmt = struct.pack("<HHIIHHHHI16s", WAVE_FORMAT_EXTENSIBLE, channels, self.rate,
+                          self.rate * block_align, block_align, 32, 22, 32, 0,
+                          struct.pack("<H", WAVE_FORMAT_IEEE_FLOAT)
+                          + b"\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71")
+        self.f.write(struct.pack("<4sI4s", b"RIFF", 0, b"WAVE"))
+        self.f.write(struct.pack("<4sI", b"fmt ", len(fmt)) + fmt)
+        self.f.write(struct.pack("<4sI", b"data", 0))
+        self.data_start = self.f.tell()
+
+    def write(self, block):
+        block = np.ascontiguousarray(block, dtype="<f4").reshape(-1, self.channels)
+        self.f.write(block.tobytes())
+        self.frames += block.shape[0]
+
+    def close(self):
+        size = self.frames * 4 * self.channels
+        self.f.seek(4)
+        self.f.write(struct.pack("<I", self.data_start - 8 + size))
+        self.f.seek(self.data_start - 4)
+        self.f.write(struct.pack("<I", size))
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()